@@ -0,0 +1,63 @@
+import numpy as np
+
+from app.rewards import REWARD_WEIGHTS
+
+
+class DestinationCatalogue:
+    """Danh mục địa điểm dạng cột (mảng NumPy) của một thành phố.
+
+    Chỉ số trong các mảng trùng với vị trí trong danh sách destinations và với hàng/cột Q-table.
+    Bộ lọc theo loại và ngân sách là phép mask/bisect, bước chọn điểm kế tiếp là argmax có mask.
+    """
+
+    def __init__(self, destinations: list):
+        self.n = len(destinations)
+        self.names = [d["name"] for d in destinations]
+        self.types = sorted({d.get("type") or "" for d in destinations})
+        self.type_codes_by_name = {t: code for code, t in enumerate(self.types)}
+        self.type_codes = np.array(
+            [self.type_codes_by_name[d.get("type") or ""] for d in destinations], dtype=np.int16
+        )
+        self.prices = np.array([d.get("ticket_price") or 0 for d in destinations], dtype=np.float64)
+        self.popularity = np.array([d.get("popularity") or 0 for d in destinations], dtype=np.float64)
+        self.sentiment = np.array([d.get("sentiment_score") or 0.0 for d in destinations], dtype=np.float64)
+        self.latitude = np.array([d.get("latitude") or np.nan for d in destinations], dtype=np.float64)
+        self.longitude = np.array([d.get("longitude") or np.nan for d in destinations], dtype=np.float64)
+        # Các địa điểm trùng tên (dữ liệu nhập trùng) dùng chung một mã để loại cùng lúc khi đã ghé
+        _, self.name_codes = np.unique(np.array(self.names, dtype=object), return_inverse=True)
+
+        # Phần điểm thưởng không phụ thuộc vào chuyển tiếp (cùng hệ số với RewardEngine)
+        self.static_scores = (
+            self.popularity * REWARD_WEIGHTS["popularity"] + self.sentiment * REWARD_WEIGHTS["sentiment"]
+            + self.prices * REWARD_WEIGHTS["price"]
+        )
+
+        self.type_masks = {code: self.type_codes == code for code in range(len(self.types))}
+        self.price_order = np.argsort(self.prices, kind="stable")
+        self.sorted_prices = self.prices[self.price_order]
+
+    def within_budget(self, max_budget: float) -> np.ndarray:
+        """Chỉ số các địa điểm có giá vé <= max_budget (bisect trên mảng giá đã sắp xếp)."""
+        return self.price_order[:np.searchsorted(self.sorted_prices, max_budget, side="right")]
+
+    def candidate_mask(self, preferred_type: str = "", max_budget: float = float("inf")) -> np.ndarray:
+        """Mask các địa điểm thỏa loại ưa thích và ngân sách."""
+        mask = np.zeros(self.n, dtype=bool)
+        mask[self.within_budget(max_budget)] = True
+        if preferred_type:
+            code = self.type_codes_by_name.get(preferred_type)
+            if code is None:
+                return np.zeros(self.n, dtype=bool)
+            mask &= self.type_masks[code]
+        return mask
+
+    def mark_visited(self, mask: np.ndarray, index: int):
+        """Loại địa điểm (và các bản trùng tên) khỏi mask."""
+        mask[self.name_codes == self.name_codes[index]] = False
+
+    @staticmethod
+    def best_next(q_row: np.ndarray, mask: np.ndarray) -> int:
+        """Argmax của hàng Q-table trên các ứng viên còn lại, -1 nếu không còn ứng viên."""
+        if not mask.any():
+            return -1
+        return int(np.where(mask, q_row, -np.inf).argmax())
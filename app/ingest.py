@@ -0,0 +1,633 @@
+"""Nhập hàng loạt địa điểm, hình ảnh và bình luận từ file JSON, NDJSON hoặc CSV (có thể nén .gz).
+
+    python -m app.ingest destinations app/data/destinations.json --create-cities
+    python -m app.ingest images images.csv
+    python -m app.ingest reviews reviews.ndjson --chunk-size 2000 --rescore
+
+File được đọc theo luồng và ghi theo lô (executemany) trong từng transaction của chunk-size bản ghi,
+nên chạy lại cùng một file không tạo bản ghi trùng. Địa điểm được khử trùng theo (city_id, name), bình luận theo
+review_id (hoặc id) của nguồn, nếu không có thì theo nội dung và thứ tự xuất hiện trong file.
+Sau khi nhập, Q-table được nới cho địa điểm mới, thời gian di chuyển của địa điểm đổi tọa độ bị xóa và snapshot
+của mọi thành phố có dữ liệu thay đổi được nạp lại.
+"""
+import sys
+import csv
+import gzip
+import json
+import hashlib
+import argparse
+from datetime import datetime
+from collections import Counter
+
+import numpy as np
+import structlog
+
+from app.services import get_db_connection
+from app.sparse_qtable import TopKQTable
+from app.invalidation import invalidate_city
+from app.utils import log_every_n
+
+logger = structlog.get_logger()
+
+KINDS = ("destinations", "images", "reviews")
+FORMATS = ("json", "ndjson", "csv")
+READ_SIZE = 1 << 16
+# Số tên tối đa trong một mệnh đề IN
+IN_BATCH = 500
+
+UPSERT_DESTINATION_SQL = (
+    "INSERT INTO destinations (name, city_id, type, opening_hours, ticket_price, popularity, latitude, longitude) "
+    "VALUES (%s, %s, %s, %s, %s, %s, %s, %s) "
+    "ON DUPLICATE KEY UPDATE type = VALUES(type), opening_hours = VALUES(opening_hours), "
+    "ticket_price = VALUES(ticket_price), popularity = VALUES(popularity), "
+    "latitude = COALESCE(VALUES(latitude), latitude), longitude = COALESCE(VALUES(longitude), longitude)"
+)
+INSERT_IMAGE_SQL = "INSERT INTO destination_images (destination_id, image_url) VALUES (%s, %s)"
+INSERT_REVIEW_SQL = (
+    "INSERT INTO reviews (submission_id, destination_id, review_text, sentiment_score, created_at) "
+    # Thời điểm có múi giờ đi qua giây epoch để MySQL đổi theo múi giờ của session, giống app.review_queue
+    "VALUES (%s, %s, %s, NULL, COALESCE(%s, FROM_UNIXTIME(%s), NOW())) "
+    "ON DUPLICATE KEY UPDATE id = id"
+)
+
+def detect_format(path: str) -> str:
+    name = path[:-3] if path.endswith(".gz") else path
+    extension = name.rsplit(".", 1)[-1].lower()
+    if extension in ("ndjson", "jsonl"):
+        return "ndjson"
+    if extension in FORMATS:
+        return extension
+    raise ValueError(f"Cannot detect format of {path}, use --format")
+
+
+class _JsonStream:
+    """Con trỏ đọc dần một file JSON cho json.JSONDecoder.raw_decode, chỉ giữ phần chưa đọc trong bộ nhớ."""
+
+    WHITESPACE = " \t\r\n"
+    # Ký tự có thể nối tiếp một số JSON: số kết thúc trước các ký tự này có thể đã bị cắt ở ranh giới đọc
+    NUMBER_CHARS = "0123456789.eE+-"
+
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _read(self) -> bool:
+        chunk = self.f.read(READ_SIZE)
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        self.eof = not chunk
+        return bool(chunk)
+
+    def peek(self, skip: str = WHITESPACE) -> str:
+        """Ký tự kế tiếp sau khi bỏ qua các ký tự trong skip, "" nếu đã hết file."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in skip:
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._read():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Invalid JSON: expected {char!r}, found {found or 'end of file'!r}")
+        self.pos += 1
+
+    def value(self):
+        """Parse một giá trị JSON tại con trỏ, đọc thêm nếu giá trị bị cắt ở cuối buffer."""
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # Số dừng ở cuối buffer hoặc trước "." / "e" ("1." của "1.5") có thể bị cắt: đọc thêm rồi parse lại
+                if self.eof or (end < len(self.buffer) and self.buffer[end] not in self.NUMBER_CHARS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._read()
+
+
+def _iter_json_array(f):
+    """Đọc từng phần tử của mảng JSON mà không nạp cả file.
+
+    File phải là một mảng ở cấp đầu, hoặc một object mà giá trị mảng đầu tiên chứa các bản ghi
+    (như {"destinations": [...]}); các thuộc tính khác đứng trước mảng được parse rồi bỏ qua.
+    Dấu phân cách được kiểm tra như json.load: thiếu hoặc thừa "," đều là lỗi.
+    """
+    stream = _JsonStream(f)
+    first = stream.peek()
+    if first == "{":
+        stream.pos += 1
+        while True:
+            if stream.peek() == "}":
+                raise ValueError("JSON object has no array of records")
+            key = stream.value()
+            if not isinstance(key, str):
+                raise ValueError("Invalid JSON: object key must be a string")
+            stream.expect(":")
+            if stream.peek() == "[":
+                break
+            stream.value()
+            if stream.peek() != "}":
+                stream.expect(",")
+    elif first != "[":
+        raise ValueError("JSON file must contain an array of records")
+    stream.expect("[")
+    if stream.peek() == "]":
+        stream.pos += 1
+    else:
+        while True:
+            if stream.peek() == "]":
+                raise ValueError("Invalid JSON: trailing comma in array")
+            yield stream.value()
+            char = stream.peek()
+            if char == "]":
+                stream.pos += 1
+                break
+            if char != ",":
+                raise ValueError(f"Invalid JSON: expected ',' or ']', found {char or 'end of file'!r}")
+            stream.pos += 1
+    if first == "[" and stream.peek():
+        raise ValueError("Invalid JSON: extra data after array")
+
+
+def iter_records(path: str, fmt: str = None):
+    """Sinh (vị trí, bản ghi) từ file; dòng NDJSON hỏng được trả về dạng (vị trí, ValueError)."""
+    fmt = fmt or detect_format(path)
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            for line_no, row in enumerate(csv.DictReader(f), 2):
+                yield line_no, row
+        elif fmt == "ndjson":
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_no, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, ValueError(f"Invalid JSON: {e}")
+        else:
+            for index, record in enumerate(_iter_json_array(f)):
+                yield index, record
+
+
+def _text(record: dict, fields: tuple, max_length: int = None, required: bool = True):
+    for field in fields:
+        value = record.get(field)
+        if value is not None and str(value).strip():
+            value = str(value).strip()
+            if max_length and len(value) > max_length:
+                raise ValueError(f"{fields[0]} longer than {max_length} characters")
+            return value
+    if required:
+        raise ValueError(f"{fields[0]} is required")
+    return None
+
+
+def _number(record: dict, field: str, cast, minimum: float = None, maximum: float = None):
+    value = record.get(field)
+    if value is None or value == "":
+        return None
+    try:
+        value = cast(float(value)) if cast is int else cast(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"{field} must be a number")
+    if value != value:
+        raise ValueError(f"{field} must be a number")
+    if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        raise ValueError(f"{field} out of range")
+    return value
+
+
+def _datetime(record: dict, field: str):
+    """Thời điểm ISO 8601 ("2024-05-01", "2024-05-01 08:30", "2024-05-01T08:30:00+07:00"), None nếu trống."""
+    value = record.get(field)
+    if value is None or str(value).strip() == "":
+        return None
+    try:
+        value = datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        raise ValueError(f"{field} must be an ISO 8601 date or datetime")
+    # Cột DATETIME và FROM_UNIXTIME không nhận thời điểm trước 1970
+    if value.year < 1970:
+        raise ValueError(f"{field} out of range")
+    return value
+
+
+def _images(value) -> list:
+    """Danh sách URL hình ảnh; trong CSV các URL cách nhau bởi '|'."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split("|")
+    urls = [str(url).strip() for url in value if str(url).strip()]
+    for url in urls:
+        if len(url) > 500:
+            raise ValueError("image_url longer than 500 characters")
+    return urls
+
+
+def validate(kind: str, record) -> dict:
+    """Chuẩn hóa một bản ghi đầu vào, ném ValueError nếu không hợp lệ."""
+    if isinstance(record, Exception):
+        raise record
+    if not isinstance(record, dict):
+        raise ValueError("Record must be an object")
+    row = {
+        "city": _text(record, ("city",), 50),
+        "country": _text(record, ("country",), 50, required=False),
+    }
+    if kind == "destinations":
+        coordinates = record.get("coordinates") or {}
+        latitude = {"latitude": record.get("latitude", record.get("lat", coordinates.get("lat")))}
+        longitude = {"longitude": record.get("longitude", record.get("lon", coordinates.get("lon")))}
+        row.update({
+            "name": _text(record, ("name",), 100),
+            "type": _text(record, ("type",), 50, required=False),
+            "opening_hours": _text(record, ("opening_hours",), 20, required=False),
+            "ticket_price": _number(record, "ticket_price", int, minimum=0),
+            "popularity": _number(record, "popularity", int, minimum=0),
+            "latitude": _number(latitude, "latitude", float, -90, 90),
+            "longitude": _number(longitude, "longitude", float, -180, 180),
+            "images": _images(record.get("images")),
+        })
+        if (row["latitude"] is None) != (row["longitude"] is None):
+            raise ValueError("latitude and longitude must be given together")
+    elif kind == "images":
+        row.update({
+            "name": _text(record, ("destination", "destination_name", "name"), 100),
+            "images": _images(record.get("image_url") or record.get("url") or record.get("images")),
+        })
+        if not row["images"]:
+            raise ValueError("image_url is required")
+    else:
+        row.update({
+            "name": _text(record, ("destination", "destination_name", "name"), 100),
+            "review_text": _text(record, ("review_text", "text")),
+            "created_at": _datetime(record, "created_at"),
+            "review_id": _text(record, ("review_id", "id"), 100, required=False),
+        })
+    return row
+
+
+def _batches(items: list, size: int = IN_BATCH):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class Ingestor:
+    """Ghi các bản ghi đã kiểm tra theo từng chunk, mỗi chunk một transaction."""
+
+    def __init__(self, kind: str, create_cities: bool = False, country: str = "Vietnam", dry_run: bool = False,
+                 rejects=None):
+        self.kind = kind
+        self.create_cities = create_cities
+        self.country = country
+        self.dry_run = dry_run
+        self.rejects = rejects
+        self.stats = Counter()
+        # Thành phố đã có trong database; thành phố tạo trong chunk chỉ được thêm vào sau khi chunk commit
+        self.cities = {}
+        self._chunk_cities = {}
+        self.created_cities = set()
+        # city_id -> {"added": số địa điểm mới, "moved": tên địa điểm đổi tọa độ} của mọi thành phố đã commit,
+        # cộng dồn từ _chunk_affected của từng chunk sau khi commit thành công
+        self.affected = {}
+        self._chunk_affected = {}
+        self.seen = set()
+        # Số lần mỗi nội dung bình luận (không có review_id) đã xuất hiện trong file
+        self.review_occurrences = Counter()
+
+    def reject(self, position, error: Exception, record):
+        """Đếm bản ghi bị loại và ghi nó vào file --rejects (hoặc log nếu không có file)."""
+        self.stats["rejected"] += 1
+        if self.rejects:
+            self.rejects.write(json.dumps({
+                "position": position,
+                "error": str(error),
+                "record": None if isinstance(record, Exception) else record,
+            }, ensure_ascii=False, default=str) + "\n")
+        elif log_every_n("ingest_rejected", 1000):
+            logger.warning("Rejected record", position=position, error=str(error))
+
+    def _city_id(self, cursor, row: dict) -> int:
+        city = row["city"]
+        if city in self.cities:
+            return self.cities[city]
+        if city in self._chunk_cities:
+            return self._chunk_cities[city]
+        cursor.execute("SELECT id FROM cities WHERE name = %s", (city,))
+        result = cursor.fetchone()
+        if result:
+            self.cities[city] = result[0]
+            return result[0]
+        if not self.create_cities:
+            raise ValueError(f"City {city} not found, use --create-cities")
+        cursor.execute("INSERT INTO cities (name, country) VALUES (%s, %s)", (city, row["country"] or self.country))
+        # --dry-run tạo lại thành phố ở mỗi chunk nhưng chỉ đếm một lần
+        if city not in self.created_cities:
+            self.created_cities.add(city)
+            self.stats["cities_created"] += 1
+        self._chunk_cities[city] = cursor.lastrowid
+        return cursor.lastrowid
+
+    def _affected(self, city_id: int) -> dict:
+        return self._chunk_affected.setdefault(city_id, {"added": 0, "moved": set()})
+
+    def _merge_affected(self):
+        for city_id, info in self._chunk_affected.items():
+            affected = self.affected.setdefault(city_id, {"added": 0, "moved": set()})
+            affected["added"] += info["added"]
+            affected["moved"].update(info["moved"])
+
+    def _existing_destinations(self, cursor, city_id: int, names: list) -> dict:
+        """{name: (id, latitude, longitude)} của các địa điểm đã có trong database."""
+        existing = {}
+        for batch in _batches(names):
+            placeholders = ", ".join(["%s"] * len(batch))
+            cursor.execute(
+                f"SELECT name, id, latitude, longitude FROM destinations WHERE city_id = %s AND name IN ({placeholders})",
+                [city_id] + batch
+            )
+            existing.update({name: (destination_id, lat, lon) for name, destination_id, lat, lon in cursor.fetchall()})
+        return existing
+
+    def _write_destinations(self, cursor, rows: dict):
+        by_city = {}
+        for (city_id, name), row in rows.items():
+            by_city.setdefault(city_id, {})[name] = row
+        for city_id, city_rows in by_city.items():
+            existing = self._existing_destinations(cursor, city_id, list(city_rows))
+            affected = self._affected(city_id)
+            for name, row in city_rows.items():
+                if name not in existing:
+                    affected["added"] += 1
+                    continue
+                _, lat, lon = existing[name]
+                # Cột FLOAT chỉ giữ ~7 chữ số có nghĩa
+                if row["latitude"] is not None and (
+                    lat is None or abs(lat - row["latitude"]) > 1e-4 or abs(lon - row["longitude"]) > 1e-4
+                ):
+                    affected["moved"].add(name)
+            self.stats["destinations_inserted"] += sum(name not in existing for name in city_rows)
+            self.stats["destinations_updated"] += sum(name in existing for name in city_rows)
+            cursor.executemany(UPSERT_DESTINATION_SQL, [
+                (name, city_id, row["type"], row["opening_hours"], row["ticket_price"], row["popularity"],
+                 row["latitude"], row["longitude"])
+                for name, row in city_rows.items()
+            ])
+        self._write_images(cursor, rows)
+
+    def _destination_ids(self, cursor, rows: dict) -> dict:
+        by_city = {}
+        for city_id, name in rows:
+            by_city.setdefault(city_id, []).append(name)
+        ids = {}
+        for city_id, names in by_city.items():
+            for name, (destination_id, _, _) in self._existing_destinations(cursor, city_id, names).items():
+                ids[(city_id, name)] = destination_id
+        return ids
+
+    def _write_images(self, cursor, rows: dict):
+        ids = self._destination_ids(cursor, rows)
+        wanted = {}
+        for key, row in rows.items():
+            if key not in ids:
+                self.stats["rejected"] += 1
+                logger.warning("Destination not found for images", city_id=key[0], destination=key[1])
+                continue
+            self._affected(key[0])
+            for url in row["images"]:
+                wanted[(ids[key], url)] = None
+        if not wanted:
+            return
+        existing = set()
+        for batch in _batches(sorted({destination_id for destination_id, _ in wanted})):
+            placeholders = ", ".join(["%s"] * len(batch))
+            cursor.execute(
+                f"SELECT destination_id, image_url FROM destination_images WHERE destination_id IN ({placeholders})",
+                batch
+            )
+            existing.update(cursor.fetchall())
+        new_images = [key for key in wanted if key not in existing]
+        cursor.executemany(INSERT_IMAGE_SQL, new_images)
+        self.stats["images_inserted"] += len(new_images)
+        self.stats["duplicates"] += len(wanted) - len(new_images)
+
+    def _review_key(self, city_id: int, row: dict) -> str:
+        """Khóa submission_id của bình luận nhập từ file.
+
+        Theo review_id của nguồn nếu có; nếu không thì theo nội dung cùng số lần nội dung đó đã xuất hiện trước
+        trong file, nên chạy lại cùng file không nhân đôi mà hai bình luận giống hệt nhau vẫn được giữ cả hai.
+        """
+        if row["review_id"]:
+            return hashlib.md5(f"ingest:{row['review_id']}".encode("utf-8")).hexdigest()
+        created_at = row["created_at"].isoformat() if row["created_at"] else ""
+        content = "\x1f".join((str(city_id), row["name"], created_at, row["review_text"]))
+        digest = hashlib.md5(content.encode("utf-8")).digest()
+        occurrence = self.review_occurrences[digest]
+        self.review_occurrences[digest] += 1
+        return hashlib.md5(digest + str(occurrence).encode()).hexdigest()
+
+    def _write_reviews(self, cursor, rows: list):
+        ids = self._destination_ids(cursor, {(city_id, row["name"]): row for city_id, row in rows})
+        reviews = []
+        for city_id, row in rows:
+            destination_id = ids.get((city_id, row["name"]))
+            if destination_id is None:
+                self.stats["rejected"] += 1
+                logger.warning("Destination not found for review", city_id=city_id, destination=row["name"])
+                continue
+            self._affected(city_id)
+            created_at = row["created_at"]
+            aware = created_at is not None and created_at.tzinfo is not None
+            reviews.append((self._review_key(city_id, row), destination_id, row["review_text"],
+                            None if aware else created_at, created_at.timestamp() if aware else None))
+        if not reviews:
+            return
+        # Chỉ tra các khóa của chunk trên khóa duy nhất submission_id, không đọc lại bình luận đã có
+        existing = set()
+        for batch in _batches(sorted({review[0] for review in reviews})):
+            placeholders = ", ".join(["%s"] * len(batch))
+            cursor.execute(f"SELECT submission_id FROM reviews WHERE submission_id IN ({placeholders})", batch)
+            existing.update(row[0] for row in cursor.fetchall())
+        new_reviews = {}
+        for review in reviews:
+            if review[0] in existing or review[0] in new_reviews:
+                self.stats["duplicates"] += 1
+                continue
+            new_reviews[review[0]] = review
+        cursor.executemany(INSERT_REVIEW_SQL, list(new_reviews.values()))
+        self.stats["reviews_inserted"] += len(new_reviews)
+
+    def write_chunk(self, conn, rows: list):
+        """Ghi một chunk (position, record, row) trong một transaction; lỗi thì rollback cả chunk."""
+        cursor = conn.cursor()
+        self._chunk_affected = {}
+        self._chunk_cities = {}
+        try:
+            keyed, reviews = {}, []
+            for position, record, row in rows:
+                try:
+                    city_id = self._city_id(cursor, row)
+                except ValueError as e:
+                    self.reject(position, e, record)
+                    continue
+                if self.kind == "reviews":
+                    reviews.append((city_id, row))
+                    continue
+                key = (city_id, row["name"])
+                if key in self.seen or key in keyed:
+                    self.stats["duplicates"] += 1
+                if self.kind == "images" and key in keyed:
+                    keyed[key]["images"] = keyed[key]["images"] + row["images"]
+                else:
+                    # Bản ghi sau ghi đè bản ghi trước cùng (city_id, name)
+                    keyed[key] = row
+            if self.kind == "destinations":
+                self._write_destinations(cursor, keyed)
+            elif self.kind == "images":
+                self._write_images(cursor, keyed)
+            else:
+                self._write_reviews(cursor, reviews)
+            if self.dry_run:
+                conn.rollback()
+            else:
+                conn.commit()
+                self._merge_affected()
+                self.cities.update(self._chunk_cities)
+            self.seen.update(keyed)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._chunk_cities = {}
+            cursor.close()
+
+    def _extend_q_table(self, cursor, city_id: int) -> bool:
+        """Nới Q-table đã lưu thêm hàng/cột giá trị 0 cho các địa điểm mới.
+
+        Địa điểm được đánh chỉ số theo id nên địa điểm mới luôn nằm cuối; kết quả huấn luyện cũ được giữ nguyên.
+        """
+        cursor.execute("SELECT q_table FROM q_tables WHERE city_id = %s FOR UPDATE", (city_id,))
+        result = cursor.fetchone()
+        if not result:
+            return False
+        cursor.execute("SELECT latitude, longitude FROM destinations WHERE city_id = %s ORDER BY id", (city_id,))
+        coordinates = np.array(
+            [[np.nan if value is None else value for value in row] for row in cursor.fetchall()], dtype=np.float64
+        ).reshape(-1, 2)
+        n = len(coordinates)
+        data = json.loads(result[0])
+        if isinstance(data, dict) and data.get("format") == TopKQTable.FORMAT:
+            q_table = TopKQTable.from_dict(data)
+            if q_table.n_states >= n:
+                return False
+            q_table_json = json.dumps(q_table.extend(coordinates[:, 0], coordinates[:, 1]).to_dict())
+        else:
+            q_table = np.array(data, dtype=np.float64)
+            # Bảng lệch kích thước theo cách khác (ví dụ địa điểm bị xóa) để load_q_table loại bỏ
+            if q_table.ndim != 2 or q_table.shape[0] != q_table.shape[1] or len(q_table) >= n:
+                return False
+            padding = n - len(q_table)
+            q_table_json = json.dumps(np.pad(q_table, ((0, padding), (0, padding))).tolist())
+        cursor.execute("UPDATE q_tables SET q_table = %s WHERE city_id = %s", (q_table_json, city_id))
+        return True
+
+    def invalidate(self):
+        """Làm mới dữ liệu phụ thuộc vào các thành phố vừa được ghi.
+
+        Thêm địa điểm thì Q-table được nới cho địa điểm mới; địa điểm đổi tọa độ thì xóa các thời gian di chuyển
+        liên quan. Mọi thành phố đã ghi (kể cả chỉ đổi giá, loại, độ phổ biến, hình ảnh hay bình luận) đều được báo
+        cho các worker nạp lại snapshot qua app.invalidation.
+        """
+        if self.dry_run or not self.affected:
+            return
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            for city_id, info in self.affected.items():
+                if info["added"] and self._extend_q_table(cursor, city_id):
+                    self.stats["q_tables_extended"] += 1
+                for batch in _batches(sorted(info["moved"])):
+                    placeholders = ", ".join(["%s"] * len(batch))
+                    cursor.execute(
+                        "DELETE FROM travel_times WHERE city_id = %s "
+                        f"AND (start_location IN ({placeholders}) OR end_location IN ({placeholders}))",
+                        [city_id] + batch + batch
+                    )
+                    self.stats["travel_times_invalidated"] += cursor.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+        for city_id, info in self.affected.items():
+            invalidate_city(city_id)
+            logger.info("City data changed", city_id=city_id, added=info["added"], moved=len(info["moved"]))
+        self.stats["cities_invalidated"] += len(self.affected)
+
+
+def ingest(kind: str, path: str, fmt: str = None, chunk_size: int = 1000, create_cities: bool = False,
+           country: str = "Vietnam", dry_run: bool = False, rejects_path: str = None) -> dict:
+    """Nhập một file, trả về thống kê số bản ghi đã đọc, ghi, trùng và bị loại."""
+    rejects = open(rejects_path, "w", encoding="utf-8") if rejects_path else None
+    ingestor = Ingestor(kind, create_cities, country, dry_run, rejects)
+    conn = get_db_connection()
+    try:
+        chunk = []
+        for position, record in iter_records(path, fmt):
+            ingestor.stats["read"] += 1
+            try:
+                chunk.append((position, record, validate(kind, record)))
+            except ValueError as e:
+                ingestor.reject(position, e, record)
+                continue
+            if len(chunk) >= chunk_size:
+                ingestor.write_chunk(conn, chunk)
+                chunk = []
+                logger.info("Ingested chunk", kind=kind, position=position, **ingestor.stats)
+        if chunk:
+            ingestor.write_chunk(conn, chunk)
+    finally:
+        conn.close()
+        if rejects:
+            rejects.close()
+        # Các chunk đã commit trước chunk lỗi vẫn cần nới Q-table, xóa thời gian di chuyển cũ và báo các worker
+        ingestor.invalidate()
+    logger.info("Ingestion completed", kind=kind, path=path, dry_run=dry_run, **ingestor.stats)
+    return dict(ingestor.stats)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("kind", choices=KINDS)
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS, default=None, help="Mặc định đoán theo đuôi file")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Số bản ghi mỗi transaction")
+    parser.add_argument("--create-cities", action="store_true", help="Tạo thành phố chưa có trong bảng cities")
+    parser.add_argument("--country", default="Vietnam", help="Quốc gia cho thành phố mới nếu bản ghi không có")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ kiểm tra, rollback mọi transaction")
+    parser.add_argument("--rejects", default=None, help="Ghi các bản ghi bị loại ra file NDJSON")
+    parser.add_argument("--rescore", action="store_true", help="Chấm điểm cảm xúc các bình luận mới sau khi nhập")
+    args = parser.parse_args(argv)
+
+    stats = ingest(args.kind, args.path, args.format, args.chunk_size, args.create_cities,
+                   args.country, args.dry_run, args.rejects)
+    if args.rescore and stats.get("reviews_inserted"):
+        from app.sentiment_store import rescore_stale
+
+        stats["reviews_rescored"] = rescore_stale()
+    print(json.dumps(stats, indent=2))
+    # Lỗi khi không có bản ghi nào hợp lệ
+    return 1 if stats.get("read") and stats.get("rejected", 0) >= stats["read"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+import os
+import time
+import threading
+import structlog
+
+logger = structlog.get_logger()
+
+# Mỗi thành phố có một file đánh dấu; job nhập dữ liệu ghi lại file, mọi worker so mtime để xóa cache của mình
+CACHE_INVALIDATION_DIR = os.getenv("CACHE_INVALIDATION_DIR", "/tmp/cache_invalidation")
+
+_handlers = []
+_seen = {}
+_lock = threading.Lock()
+
+
+def on_city_invalidated(handler):
+    """Đăng ký hàm handler(city_id) xóa dữ liệu cache của một thành phố (dùng như decorator)."""
+    _handlers.append(handler)
+    return handler
+
+
+def _stamp_path(city_id: int) -> str:
+    return os.path.join(CACHE_INVALIDATION_DIR, f"city_{city_id}")
+
+
+def _stamp(city_id: int):
+    try:
+        return os.stat(_stamp_path(city_id)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _clear_local(city_id: int):
+    for handler in _handlers:
+        handler(city_id)
+
+
+def invalidate_city(city_id: int, local: bool = True):
+    """Báo cho các worker khác xóa cache của thành phố; local=False nếu process hiện tại đã tự cập nhật."""
+    os.makedirs(CACHE_INVALIDATION_DIR, exist_ok=True)
+    path = _stamp_path(city_id)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(str(time.time_ns()))
+    os.replace(tmp_path, path)
+    with _lock:
+        _seen[city_id] = _stamp(city_id)
+    if local:
+        _clear_local(city_id)
+    logger.info("Invalidated city caches", city_id=city_id)
+
+
+def refresh_city(city_id: int) -> bool:
+    """Xóa cache cục bộ nếu thành phố đã bị đánh dấu kể từ lần kiểm tra trước. Chỉ tốn một lần stat."""
+    stamp = _stamp(city_id)
+    with _lock:
+        if stamp is None or _seen.get(city_id) == stamp:
+            return False
+        _seen[city_id] = stamp
+    _clear_local(city_id)
+    logger.info("Refreshed invalidated city caches", city_id=city_id)
+    return True
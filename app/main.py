@@ -1,14 +1,18 @@
-from fastapi import FastAPI, Depends
+import time
+from fastapi import FastAPI, Depends, Request
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, Response
 from app.routes import router
 from app.services import get_db_connection
+from app.startup import lifespan, readiness
+from app.metrics import REQUEST_LATENCY, render_metrics
 from fastapi.middleware.cors import CORSMiddleware
 import structlog
 import mysql.connector
 
 logger = structlog.get_logger()
 
-app = FastAPI(title="Travel Recommendation System")
+app = FastAPI(title="Travel Recommendation System", lifespan=lifespan)
 
 # Cấu hình CORS
 app.add_middleware(
@@ -19,6 +23,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Ghi histogram thời gian xử lý theo route template (không theo URL cụ thể)."""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        endpoint = route.path if route is not None else "unmatched"
+        REQUEST_LATENCY.labels(request.method, endpoint, str(status)).observe(time.perf_counter() - started)
+
 # Mount thư mục static
 
 # Đăng ký các route
@@ -38,4 +56,18 @@ async def health_check():
         return {"status": "healthy", "database": "connected"}
     except mysql.connector.Error as e:
         logger.error("Health check failed", error=str(e))
-        return {"status": "unhealthy", "database": "disconnected"}
\ No newline at end of file
+        return {"status": "unhealthy", "database": "disconnected"}
+
+@app.get("/ready")
+async def readiness_check():
+    """Kiểm tra worker đã warm-up xong chưa (dùng cho load balancer)."""
+    if not readiness["ready"]:
+        status = "failed" if readiness["error"] else "warming_up"
+        return JSONResponse(status_code=503, content={"status": status, **readiness})
+    return {"status": "ready", **readiness}
+
+@app.get("/metrics")
+def metrics():
+    """Số liệu Prometheus."""
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
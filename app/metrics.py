@@ -0,0 +1,84 @@
+import os
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest,
+)
+
+# Với uvicorn --workers > 1, đặt PROMETHEUS_MULTIPROC_DIR để gộp số liệu của mọi worker. Thư mục phải được xóa
+# trước khi khởi động các worker (xem CMD trong Dockerfile), không phải trong từng worker.
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Thời gian xử lý request theo endpoint",
+    ["method", "endpoint", "status"],
+)
+STAGE_LATENCY = Histogram(
+    "stage_duration_seconds",
+    "Thời gian theo từng giai đoạn (db_connect, db, ors, weather, model_inference, q_table_load, route_search, trip_planning, review_batch, snapshot_build)",
+    ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Số lần tra cache theo kết quả hit/miss",
+    ["cache", "result"],
+)
+DB_CONNECTIONS = Counter(
+    "db_connections_opened_total",
+    "Số kết nối MySQL được mở (mỗi truy vấn hiện mở một kết nối mới)",
+)
+CACHE_SIZE = Gauge(
+    "cache_entries",
+    "Số phần tử hiện có trong cache",
+    ["cache"],
+    multiprocess_mode="livesum",
+)
+ORS_EVENTS = Counter(
+    "ors_client_events_total",
+    "Sự kiện của ORS client theo endpoint: requests, queued, throttled (ORS trả 429), rejected",
+    ["endpoint", "event"],
+)
+ORS_QUEUE_DEPTH = Gauge(
+    "ors_client_queue_depth",
+    "Số request đang chờ token ORS",
+    ["endpoint"],
+    multiprocess_mode="livesum",
+)
+REVIEW_QUEUE_DEPTH = Gauge(
+    "review_queue_depth",
+    "Số bình luận đang chờ ghi trong bộ nhớ (memory) và kích thước file spill (spill_bytes)",
+    ["queue"],
+    multiprocess_mode="livesum",
+)
+
+
+def stage_timer(stage: str):
+    """Đo thời gian một giai đoạn, dùng được như context manager hoặc decorator."""
+    return STAGE_LATENCY.labels(stage).time()
+
+
+def record_cache(cache: str, hit: bool, size: int = None):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+    if size is not None:
+        CACHE_SIZE.labels(cache).set(size)
+
+
+def mark_process_dead():
+    """Bỏ số liệu live* (gauge) của worker đang dừng khỏi kết quả gộp."""
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def render_metrics() -> tuple:
+    """Trả về (nội dung, content type) cho endpoint /metrics."""
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,35 @@
+import os
+import structlog
+
+logger = structlog.get_logger()
+
+# Thư mục cache mô hình cục bộ (được mount thành volume để không tải lại mỗi lần deploy)
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", "/app/models")
+RECOMMENDER_SENTIMENT_MODEL = "nlptown/bert-base-multilingual-uncased-sentiment"
+REVIEW_SENTIMENT_MODEL = "cardiffnlp/twitter-xlm-roberta-base-sentiment"
+
+
+def is_cached(model: str) -> bool:
+    """Kiểm tra mô hình đã có trong thư mục cache cục bộ chưa."""
+    return os.path.isdir(os.path.join(MODEL_CACHE_DIR, "models--" + model.replace("/", "--")))
+
+
+def load_model_and_tokenizer(model: str):
+    """Nạp tokenizer và mô hình phân loại từ MODEL_CACHE_DIR (chỉ tải về nếu chưa có trong cache).
+
+    transformers và torch được import tại đây thay vì lúc import module để worker khởi động nhanh.
+    """
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    local_only = is_cached(model)
+    tokenizer = AutoTokenizer.from_pretrained(model, cache_dir=MODEL_CACHE_DIR, local_files_only=local_only)
+    classifier = AutoModelForSequenceClassification.from_pretrained(
+        model, cache_dir=MODEL_CACHE_DIR, local_files_only=local_only
+    )
+    logger.info("Loaded sentiment model", model=model, from_cache=local_only)
+    return classifier, tokenizer
+
+
+if __name__ == "__main__":
+    # Tải trước mô hình vào MODEL_CACHE_DIR (dùng khi build image hoặc chuẩn bị volume)
+    load_model_and_tokenizer(RECOMMENDER_SENTIMENT_MODEL)
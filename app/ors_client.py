@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import fcntl
+import heapq
+import itertools
+import threading
+from enum import IntEnum
+from email.utils import parsedate_to_datetime
+
+import requests
+import structlog
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+
+from app.metrics import ORS_EVENTS, ORS_QUEUE_DEPTH, stage_timer
+
+logger = structlog.get_logger()
+
+ORS_BASE_URL = os.getenv("ORS_BASE_URL", "https://api.openrouteservice.org")
+
+# Hạn mức mặc định theo gói miễn phí của ORS (số request mỗi phút)
+DEFAULT_LIMITS_PER_MINUTE = {
+    "directions": 40,
+    "matrix": 40,
+    "geocode": 100,
+}
+
+
+class Priority(IntEnum):
+    """Độ ưu tiên của request: số nhỏ hơn được phục vụ trước."""
+    USER = 0
+    BACKGROUND = 10
+
+
+class ORSRateLimitError(Exception):
+    """ORS đang giới hạn tần suất hoặc không kịp cấp token trong thời gian chờ cho phép."""
+
+    def __init__(self, endpoint: str, retry_after: float):
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+        super().__init__(f"ORS {endpoint} rate limited, retry after {retry_after:.1f}s")
+
+
+class SharedTokenBucket:
+    """Token bucket lưu trạng thái trong file có khóa, dùng chung giữa các worker trên cùng máy.
+
+    Một phần dung lượng (ORS_USER_RESERVE, tỷ lệ của burst) chỉ dành cho Priority.USER: request nền chỉ lấy token
+    khi bucket còn nhiều hơn phần dự trữ, nên huấn luyện ở worker này không làm request người dùng ở worker khác
+    hết token.
+    """
+
+    def __init__(self, name: str, per_minute: float, burst: float = None, state_dir: str = None,
+                 user_reserve: float = None):
+        self.name = name
+        self.rate = per_minute / 60.0
+        self.burst = burst if burst is not None else max(1.0, float(per_minute))
+        if user_reserve is None:
+            user_reserve = float(os.getenv("ORS_USER_RESERVE", 0.25))
+        # Luôn để lại ít nhất một token cho request nền
+        self.user_reserve = max(0.0, min(self.burst * user_reserve, self.burst - 1))
+        state_dir = state_dir or os.getenv("ORS_RATE_LIMIT_DIR", "/tmp/ors_rate_limit")
+        os.makedirs(state_dir, exist_ok=True)
+        self.path = os.path.join(state_dir, f"{name}.json")
+
+    def _update(self, fn):
+        with open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                raw = f.read()
+                now = time.time()
+                state = json.loads(raw) if raw else {"tokens": self.burst, "updated_at": now, "blocked_until": 0.0}
+                elapsed = max(0.0, now - state["updated_at"])
+                state["tokens"] = min(self.burst, state["tokens"] + elapsed * self.rate)
+                state["updated_at"] = now
+                result = fn(state, now)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def try_take(self, priority: Priority = Priority.USER) -> float:
+        """Lấy một token. Trả về 0 nếu thành công, ngược lại số giây cần chờ."""
+        reserve = 0.0 if priority == Priority.USER else self.user_reserve
+
+        def take(state, now):
+            if state["blocked_until"] > now:
+                return state["blocked_until"] - now
+            if state["tokens"] - reserve >= 1:
+                state["tokens"] -= 1
+                return 0.0
+            return (1 + reserve - state["tokens"]) / self.rate
+        return self._update(take)
+
+    def block_for(self, seconds: float):
+        """Chặn toàn bộ worker cho tới khi hết thời gian Retry-After."""
+        def block(state, now):
+            state["blocked_until"] = max(state["blocked_until"], now + seconds)
+            state["tokens"] = 0.0
+        self._update(block)
+
+
+class EndpointLimiter:
+    """Giới hạn tần suất cho một endpoint ORS với hàng đợi ưu tiên trong tiến trình."""
+
+    def __init__(self, bucket: SharedTokenBucket):
+        self.bucket = bucket
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._seq = itertools.count()
+
+    def acquire(self, priority: Priority, max_wait: float):
+        deadline = time.monotonic() + max_wait
+        ticket = (int(priority), next(self._seq))
+        queued = False
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            ORS_QUEUE_DEPTH.labels(self.bucket.name).set(len(self._waiters))
+            try:
+                while True:
+                    wait = None
+                    if self._waiters[0] == ticket:
+                        wait = self.bucket.try_take(priority)
+                        if wait == 0:
+                            return
+                    if not queued:
+                        queued = True
+                        _record(self.bucket.name, "queued")
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or (wait is not None and wait > remaining):
+                        _record(self.bucket.name, "rejected")
+                        raise ORSRateLimitError(self.bucket.name, wait if wait is not None else max_wait)
+                    self._cond.wait(min(wait, remaining) if wait is not None else remaining)
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                ORS_QUEUE_DEPTH.labels(self.bucket.name).set(len(self._waiters))
+                self._cond.notify_all()
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def _record(endpoint: str, event: str):
+    ORS_EVENTS.labels(endpoint, event).inc()
+
+
+def get_limiter(endpoint: str) -> EndpointLimiter:
+    with _limiters_lock:
+        if endpoint not in _limiters:
+            per_minute = float(os.getenv(
+                f"ORS_RATE_{endpoint.upper()}_PER_MIN",
+                DEFAULT_LIMITS_PER_MINUTE[endpoint]
+            ))
+            _limiters[endpoint] = EndpointLimiter(SharedTokenBucket(endpoint, per_minute))
+        return _limiters[endpoint]
+
+
+def _parse_retry_after(value: str, default: float = 60.0) -> float:
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+def _default_max_wait(priority: Priority) -> float:
+    if priority == Priority.USER:
+        return float(os.getenv("ORS_USER_MAX_WAIT", 5))
+    return float(os.getenv("ORS_BACKGROUND_MAX_WAIT", 300))
+
+
+@retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=1, min=1, max=4),
+    retry=retry_if_exception_type((requests.exceptions.ConnectionError, requests.exceptions.Timeout)),
+    reraise=True
+)
+def _send(method: str, url: str, **kwargs) -> requests.Response:
+    kwargs.setdefault("timeout", 30)
+    return requests.request(method, url, **kwargs)
+
+
+def ors_request(endpoint: str, method: str, path: str, priority: Priority = Priority.USER,
+                max_wait: float = None, **kwargs) -> requests.Response:
+    """Gửi request tới ORS qua token bucket của endpoint.
+
+    Request của người dùng được ưu tiên hơn request nền (huấn luyện, backfill). Khi ORS trả 429,
+    Retry-After được ghi vào bucket chung để mọi worker cùng tạm dừng rồi thử lại nếu còn trong max_wait.
+    Request người dùng có max_wait ngắn (ORS_USER_MAX_WAIT) nên nhanh chóng nhận ORSRateLimitError.
+    """
+    priority = Priority(priority)
+    limiter = get_limiter(endpoint)
+    max_wait = _default_max_wait(priority) if max_wait is None else max_wait
+    deadline = time.monotonic() + max_wait
+    url = path if path.startswith("http") else f"{ORS_BASE_URL}{path}"
+    while True:
+        limiter.acquire(priority, max(0.0, deadline - time.monotonic()))
+        _record(endpoint, "requests")
+        with stage_timer("ors"):
+            response = _send(method, url, **kwargs)
+        if response.status_code != 429:
+            return response
+        retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+        limiter.bucket.block_for(retry_after)
+        _record(endpoint, "throttled")
+        logger.warning("ORS rate limited", endpoint=endpoint, retry_after=retry_after, priority=priority.name)
+        if retry_after > deadline - time.monotonic():
+            raise ORSRateLimitError(endpoint, retry_after)
@@ -0,0 +1,408 @@
+"""Hàng đợi ghi sau (write-behind) cho /submit_review.
+
+Request kiểm tra đầu vào, gán review_id, ghi nối bình luận vào journal của worker (NDJSON trong REVIEW_SPILL_DIR)
+và chỉ trả 202 sau khi journal đã fsync, nên bình luận đã nhận không mất khi worker bị kill hay máy mất điện.
+fsync được gom: một lần fsync phủ mọi request đang chờ. Một luồng nền gom bình luận từ hàng đợi trong bộ nhớ mỗi
+REVIEW_BATCH_INTERVAL giây, chấm điểm cảm xúc theo lô rồi ghi reviews, review_sentiments và điểm tổng của
+destinations trong một transaction; journal được làm rỗng khi mọi bình luận trong đó đã vào database.
+
+Khi hàng đợi trong bộ nhớ đầy, MySQL lỗi hoặc journal quá REVIEW_JOURNAL_ROTATE_MB, journal được chuyển sang chờ
+ghi lại từ file khi MySQL phục hồi, kể cả sau khi worker khởi động lại. Mỗi worker giữ khóa fcntl trên các file của
+mình; worker khác chỉ nhận file khi lấy được khóa, tức là khi worker sở hữu đã dừng. review_id là khóa duy nhất nên
+ghi lại nhiều lần không tạo bình luận trùng.
+"""
+import os
+import json
+import glob
+import fcntl
+import time
+import uuid
+import queue
+import threading
+import structlog
+import mysql.connector
+
+from app.services import get_db_connection
+from app.sentiment_backends import get_sentiment_backend
+from app.sentiment_store import save_review_sentiments, score_missing_reviews, update_destination_scores
+from app.text_processing import preprocess_batch, text_hashes
+from app.metrics import REVIEW_QUEUE_DEPTH, stage_timer
+from app.utils import log_every_seconds
+
+logger = structlog.get_logger()
+
+REVIEW_BATCH_INTERVAL = float(os.getenv("REVIEW_BATCH_INTERVAL", 0.25))
+REVIEW_BATCH_SIZE = int(os.getenv("REVIEW_BATCH_SIZE", 200))
+REVIEW_QUEUE_MAX = int(os.getenv("REVIEW_QUEUE_MAX", 10000))
+REVIEW_SPILL_DIR = os.getenv("REVIEW_SPILL_DIR", "/tmp/review_spill")
+REVIEW_SPILL_MAX_BYTES = int(float(os.getenv("REVIEW_SPILL_MAX_MB", 100)) * 2**20)
+# Journal lớn hơn ngưỡng này mà vẫn còn bình luận chưa ghi được chuyển sang ghi lại để không phình mãi khi tải liên tục
+REVIEW_JOURNAL_ROTATE_BYTES = int(float(os.getenv("REVIEW_JOURNAL_ROTATE_MB", 4)) * 2**20)
+# Thời gian chờ trước khi thử lại database sau khi ghi lô thất bại
+REVIEW_RETRY_DELAY = float(os.getenv("REVIEW_RETRY_DELAY", 5))
+
+INSERT_REVIEW_SQL = (
+    "INSERT INTO reviews (submission_id, destination_id, review_text, sentiment_score, created_at) "
+    "VALUES (%s, %s, %s, %s, FROM_UNIXTIME(%s)) "
+    "ON DUPLICATE KEY UPDATE id = id"
+)
+
+
+class ReviewQueueFull(Exception):
+    """Phần bình luận trên đĩa chưa ghi vào database đã quá giới hạn."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Review queue is full")
+        self.retry_after = retry_after
+
+
+def new_review_id() -> str:
+    return uuid.uuid4().hex
+
+
+def _existing_review_ids(review_ids: list) -> set:
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        placeholders = ", ".join(["%s"] * len(review_ids))
+        cursor.execute(f"SELECT submission_id FROM reviews WHERE submission_id IN ({placeholders})", review_ids)
+        return {row[0] for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def write_review_batch(reviews: list, backend=None, skip_existing: bool = False) -> int:
+    """Chấm điểm và ghi một lô bình luận trong một transaction, trả về số bình luận đã ghi.
+
+    Mỗi bình luận là dict có review_id, destination_id, review_text, created_at (giây epoch). skip_existing bỏ qua
+    bình luận đã có trong database trước khi chấm điểm (dùng khi ghi lại từ journal).
+    """
+    if reviews and skip_existing:
+        existing = _existing_review_ids([review["review_id"] for review in reviews])
+        reviews = [review for review in reviews if review["review_id"] not in existing]
+    if not reviews:
+        return 0
+    backend = backend or get_sentiment_backend()
+    # Chấm điểm trước khi mở transaction để giữ khóa dòng ngắn nhất có thể
+    texts = [review["review_text"] for review in reviews]
+    scores = backend.star_scores(preprocess_batch(texts))
+    destination_ids = sorted({review["destination_id"] for review in reviews})
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        # Bình luận cũ chưa có điểm được chấm trước khi ghi lô (SELECT không khóa dòng) để điểm trung bình phủ mọi
+        # bình luận của địa điểm, không chỉ các bình luận gửi sau migration
+        score_missing_reviews(cursor, backend, destination_ids)
+        cursor.executemany(INSERT_REVIEW_SQL, [
+            # Giây epoch, MySQL tự đổi theo múi giờ của session nên không phụ thuộc múi giờ của worker
+            (review["review_id"], review["destination_id"], review["review_text"], score, review["created_at"])
+            for review, score in zip(reviews, scores)
+        ])
+        placeholders = ", ".join(["%s"] * len(reviews))
+        cursor.execute(
+            f"SELECT submission_id, id FROM reviews WHERE submission_id IN ({placeholders})",
+            [review["review_id"] for review in reviews]
+        )
+        row_ids = dict(cursor.fetchall())
+        save_review_sentiments(cursor, [
+            (row_ids[review["review_id"]], review["destination_id"], content_hash, backend.model_version, score)
+            for review, content_hash, score in zip(reviews, text_hashes(texts), scores)
+        ])
+        update_destination_scores(cursor, destination_ids)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    return len(reviews)
+
+
+class ReviewQueue:
+    """Hàng đợi bình luận của một worker cùng luồng ghi lô, journal và các file spill đang chờ ghi lại."""
+
+    def __init__(self, spill_dir: str = REVIEW_SPILL_DIR, max_size: int = REVIEW_QUEUE_MAX,
+                 batch_size: int = REVIEW_BATCH_SIZE, interval: float = REVIEW_BATCH_INTERVAL,
+                 spill_max_bytes: int = REVIEW_SPILL_MAX_BYTES, rotate_bytes: int = REVIEW_JOURNAL_ROTATE_BYTES):
+        self.spill_dir = spill_dir
+        self.batch_size = batch_size
+        self.interval = interval
+        self.spill_max_bytes = spill_max_bytes
+        self.rotate_bytes = rotate_bytes
+        self.queue = queue.Queue(maxsize=max_size)
+        self.pending = set()
+        # Journal đang ghi của worker và các file đã chuyển sang chờ ghi lại, mỗi file được giữ khóa fcntl
+        self._spill_file = None
+        self._spill_path = None
+        self._claimed = {}
+        self._claimed_bytes = 0
+        # review_id trong journal chưa được ghi vào database; journal chỉ được làm rỗng khi tập này rỗng
+        self._journal_open = set()
+        # Journal có bình luận không nằm trong hàng đợi bộ nhớ (hàng đợi đầy hoặc lô ghi lỗi): phải ghi lại từ file
+        self._journal_stuck = False
+        # Số dòng đã ghi vào journal và số dòng chắc chắn đã fsync (gom fsync của nhiều request)
+        self._written = 0
+        self._synced = 0
+        self._spill_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _open_spill(self):
+        """Journal của worker, tạo khi cần và giữ khóa độc quyền tới khi được chuyển sang ghi lại hoặc worker dừng.
+
+        File được khóa dưới tên tạm rồi mới đổi sang tên reviews-*.ndjson để worker khác không kịp nhận nó.
+        """
+        if self._spill_file is None:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            name = f"reviews-{uuid.uuid4().hex}.ndjson"
+            tmp_path = os.path.join(self.spill_dir, f".{name}.tmp")
+            f = open(tmp_path, "a+", encoding="utf-8")
+            fcntl.flock(f, fcntl.LOCK_EX)
+            self._spill_path = os.path.join(self.spill_dir, name)
+            os.replace(tmp_path, self._spill_path)
+            self._spill_file = f
+        return self._spill_file
+
+    def _spill_size(self) -> int:
+        if self._spill_file is None:
+            return 0
+        return os.fstat(self._spill_file.fileno()).st_size
+
+    def _update_depth(self):
+        REVIEW_QUEUE_DEPTH.labels("memory").set(self.queue.qsize())
+        REVIEW_QUEUE_DEPTH.labels("spill_bytes").set(self._spill_size() + self._claimed_bytes)
+
+    def _append(self, review: dict) -> int:
+        """Ghi nối bình luận vào journal (chưa fsync), trả về số thứ tự dòng để truyền cho _sync."""
+        with self._spill_lock:
+            f = self._open_spill()
+            f.write(json.dumps(review, ensure_ascii=False) + "\n")
+            f.flush()
+            self._journal_open.add(review["review_id"])
+            self._written += 1
+            return self._written
+
+    def _sync(self, seq: int):
+        """fsync journal tới ít nhất dòng seq; một lần fsync phủ mọi dòng đã ghi trước nó."""
+        with self._sync_lock:
+            if self._synced >= seq:
+                return
+            with self._spill_lock:
+                target = self._written
+                # Journal vừa được chuyển sang ghi lại thì đã fsync trong _rotate_journal
+                fd = os.dup(self._spill_file.fileno()) if self._spill_file is not None else None
+            if fd is not None:
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            self._synced = max(self._synced, target)
+
+    def submit(self, destination_id: int, review_text: str) -> str:
+        """Ghi bình luận vào journal (fsync) rồi đưa vào hàng đợi, trả về review_id.
+
+        Ném ReviewQueueFull khi phần trên đĩa chưa ghi vào database đã quá spill_max_bytes.
+        """
+        if self._spill_size() + self._claimed_bytes >= self.spill_max_bytes:
+            raise ReviewQueueFull(retry_after=max(1, int(REVIEW_RETRY_DELAY)))
+        review = {
+            "review_id": new_review_id(),
+            "destination_id": destination_id,
+            "review_text": review_text,
+            "created_at": time.time(),
+        }
+        # Đánh dấu trước khi đưa vào hàng đợi vì luồng ghi có thể xử lý ngay
+        self.pending.add(review["review_id"])
+        try:
+            self._sync(self._append(review))
+        except Exception:
+            self.pending.discard(review["review_id"])
+            raise
+        try:
+            self.queue.put_nowait(review)
+        except queue.Full:
+            # Bình luận đã nằm trong journal, luồng ghi sẽ ghi lại từ file
+            self._journal_stuck = True
+            if log_every_seconds("review_queue_spill", 5):
+                logger.warning("Review queue full, replaying from journal", spill_dir=self.spill_dir)
+        self._update_depth()
+        return review["review_id"]
+
+    def _take_batch(self) -> list:
+        """Chờ tối đa interval giây rồi lấy tối đa batch_size bình luận."""
+        batch = []
+        deadline = time.monotonic() + self.interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _commit(self, batch: list, replay: bool = False):
+        """Ghi một lô; nếu lô vi phạm ràng buộc (địa điểm đã bị xóa...) thì ghi từng bình luận và bỏ bình luận lỗi."""
+        try:
+            with stage_timer("review_batch"):
+                write_review_batch(batch, skip_existing=replay)
+        except mysql.connector.IntegrityError:
+            for review in batch:
+                try:
+                    write_review_batch([review], skip_existing=replay)
+                except mysql.connector.IntegrityError as e:
+                    logger.error("Dropped invalid review", review_id=review["review_id"],
+                                 destination_id=review["destination_id"], error=str(e))
+        ids = [review["review_id"] for review in batch]
+        with self._spill_lock:
+            self._journal_open.difference_update(ids)
+        self.pending.difference_update(ids)
+
+    def _write(self, batch: list) -> bool:
+        try:
+            self._commit(batch)
+        except Exception as e:
+            # Lô đã nằm trong journal: chuyển journal sang ghi lại thay vì ghi thêm một bản nữa
+            logger.error("Review batch failed, replaying from journal later", count=len(batch), error=str(e))
+            self._journal_stuck = True
+            return False
+        return True
+
+    def _rotate_journal(self):
+        """Làm rỗng journal khi mọi bình luận trong đó đã vào database.
+
+        Journal quá rotate_bytes hoặc có bình luận chỉ còn trên đĩa được chuyển sang danh sách chờ ghi lại (vẫn giữ
+        khóa) và bình luận mới ghi vào journal mới.
+        """
+        with self._spill_lock:
+            f = self._spill_file
+            if f is None:
+                return
+            if not self._journal_open:
+                if self._spill_size():
+                    f.truncate(0)
+                return
+            size = self._spill_size()
+            if size < self.rotate_bytes and not self._journal_stuck:
+                return
+            os.fsync(f.fileno())
+            self._claimed[self._spill_path] = f
+            self._claimed_bytes += size
+            self._journal_open.clear()
+            self._journal_stuck = False
+            self._spill_file = self._spill_path = None
+
+    def _claim(self, path: str):
+        """Mở và khóa một file spill; None nếu worker khác đang giữ khóa hoặc file vừa bị xóa."""
+        try:
+            f = open(path, "r+", encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # Worker khác có thể đã ghi lại xong và xóa file trước khi khóa được nhả
+            if os.fstat(f.fileno()).st_ino == os.stat(path).st_ino:
+                return f
+        except (BlockingIOError, FileNotFoundError):
+            pass
+        f.close()
+        return None
+
+    def _claim_spill_files(self) -> list:
+        """Nhận các file spill để ghi lại vào database.
+
+        Gồm journal đã chuyển sang ghi lại của worker này và mọi file không còn ai giữ khóa: khóa fcntl được kernel
+        nhả khi worker sở hữu dừng, kể cả bị kill, nên không phụ thuộc PID có thể bị dùng lại sau khi container khởi
+        động lại. Journal đang ghi của worker vẫn bị khóa nên không bị nhận ở đây.
+        """
+        for path in sorted(glob.glob(os.path.join(self.spill_dir, "reviews-*"))):
+            if path not in self._claimed:
+                f = self._claim(path)
+                if f is not None:
+                    with self._spill_lock:
+                        self._claimed[path] = f
+                        self._claimed_bytes += os.fstat(f.fileno()).st_size
+        return sorted(self._claimed)
+
+    def _release(self, path: str):
+        """Xóa file spill đã ghi lại xong rồi mới nhả khóa."""
+        os.remove(path)
+        with self._spill_lock:
+            f = self._claimed.pop(path)
+            self._claimed_bytes -= os.fstat(f.fileno()).st_size
+        f.close()
+
+    def drain_spill(self) -> bool:
+        """Ghi lại các file spill theo lô; dừng ở lô lỗi đầu tiên để thử lại sau. Trả về True nếu đã hết."""
+        if not os.path.isdir(self.spill_dir):
+            return True
+        for path in self._claim_spill_files():
+            f = self._claimed[path]
+            f.seek(0)
+            reviews = []
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    reviews.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Dòng cuối bị cắt khi worker dừng giữa chừng lúc ghi
+                    logger.error("Skipped corrupt spilled review", path=path, line=line_no)
+            for start in range(0, len(reviews), self.batch_size):
+                try:
+                    # Journal có cả bình luận đã ghi qua hàng đợi bộ nhớ: bỏ qua theo review_id
+                    self._commit(reviews[start:start + self.batch_size], replay=True)
+                except Exception as e:
+                    # Giữ file và khóa, lần sau ghi lại từ đầu
+                    logger.error("Replaying spilled reviews failed", path=path, error=str(e))
+                    return False
+            self._release(path)
+            logger.info("Replayed spilled reviews", path=path, count=len(reviews))
+        self._update_depth()
+        return True
+
+    def run(self):
+        next_drain = 0.0
+        while not self._stop.is_set() or not self.queue.empty():
+            batch = self._take_batch()
+            if batch and not self._write(batch):
+                self._stop.wait(REVIEW_RETRY_DELAY)
+            self._rotate_journal()
+            # Ghi lại phần đã spill khi hàng đợi rảnh; sau lỗi thì chờ REVIEW_RETRY_DELAY giữa các lần thử
+            if self.queue.empty() and time.monotonic() >= next_drain:
+                next_drain = 0.0 if self.drain_spill() else time.monotonic() + REVIEW_RETRY_DELAY
+            self._update_depth()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name="review-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        """Ghi nốt hàng đợi trước khi worker dừng; phần chưa ghi được vẫn nằm trong journal trên đĩa."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._spill_lock:
+            # Journal rỗng thì xóa luôn; còn bình luận chưa ghi thì để worker khác (hoặc lần khởi động sau) ghi lại
+            if self._spill_file is not None and not self._journal_open:
+                os.remove(self._spill_path)
+            files = list(self._claimed.values()) + ([self._spill_file] if self._spill_file is not None else [])
+            self._claimed, self._claimed_bytes = {}, 0
+            self._spill_file = self._spill_path = None
+        # Nhả khóa để worker khác nhận các file chưa ghi lại
+        for f in files:
+            f.close()
+
+
+review_queue = ReviewQueue()
@@ -0,0 +1,94 @@
+import os
+import json
+
+import numpy as np
+
+# Hệ số mặc định của từng thành phần phần thưởng (giữ nguyên công thức calculate_reward trước đây)
+DEFAULT_WEIGHTS = {
+    "clear_sky": 10.0,      # trời quang
+    "rain": -5.0,           # trời mưa
+    "temperature": 0.2,     # mỗi độ C
+    "travel_minute": -0.5,  # mỗi phút di chuyển
+    "type_match": 15.0,     # đúng loại địa điểm ưa thích
+    "price": -1 / 10000,    # mỗi đồng giá vé
+    "popularity": 2.0,      # mỗi điểm phổ biến
+    "sentiment": 10.0,      # điểm cảm xúc trong [-1, 1]
+}
+TERMS = ("weather", "travel", "type_match", "price", "popularity", "sentiment")
+# Hệ số dùng khi request không ghi đè, có thể chỉnh qua biến môi trường REWARD_WEIGHTS (JSON)
+REWARD_WEIGHTS = {**DEFAULT_WEIGHTS, **json.loads(os.getenv("REWARD_WEIGHTS", "{}"))}
+
+
+def load_weights(overrides: dict = None) -> dict:
+    """Hệ số REWARD_WEIGHTS, ghi đè bởi overrides (ví dụ {"travel_minute": -1})."""
+    weights = dict(REWARD_WEIGHTS)
+    if overrides:
+        unknown = set(overrides) - set(DEFAULT_WEIGHTS)
+        if unknown:
+            raise ValueError(f"Unknown reward weights: {', '.join(sorted(unknown))}")
+        weights.update({name: float(value) for name, value in overrides.items()})
+    return weights
+
+
+def weather_term(weather: dict, weights: dict) -> float:
+    description = weather.get("description", "").lower()
+    reward = 0.0
+    if "clear" in description:
+        reward += weights["clear_sky"]
+    elif "rain" in description:
+        reward += weights["rain"]
+    return reward + weather.get("temperature", 0) * weights["temperature"]
+
+
+def reward_terms(weights: dict, weather: float, travel_minutes, type_match, prices, popularity, sentiment) -> dict:
+    """Từng thành phần phần thưởng; các tham số là số hoặc mảng NumPy cùng shape (broadcast)."""
+    return {
+        "weather": weather,
+        "travel": np.asarray(travel_minutes, dtype=np.float64) * weights["travel_minute"],
+        "type_match": np.asarray(type_match, dtype=np.float64) * weights["type_match"],
+        "price": np.asarray(prices, dtype=np.float64) * weights["price"],
+        "popularity": np.asarray(popularity, dtype=np.float64) * weights["popularity"],
+        "sentiment": np.asarray(sentiment, dtype=np.float64) * weights["sentiment"],
+    }
+
+
+class RewardEngine:
+    """Tính phần thưởng cho cả mảng chuyển tiếp từ danh mục dạng cột của một thành phố.
+
+    Phần phụ thuộc điểm đến (loại, giá, phổ biến, cảm xúc) và thời tiết được tính một lần thành vector;
+    thời gian di chuyển (phút) là vector, ma trận N×N hoặc N×k tùy cách gọi. Ô chưa biết thời gian là NaN.
+    """
+
+    def __init__(self, catalogue, weights: dict = None):
+        self.catalogue = catalogue
+        self.weights = load_weights(weights)
+
+    def type_match(self, preferred_type: str) -> np.ndarray:
+        code = self.catalogue.type_codes_by_name.get(preferred_type) if preferred_type else None
+        if code is None:
+            return np.zeros(self.catalogue.n, dtype=bool)
+        return self.catalogue.type_masks[code]
+
+    def breakdown(self, weather: dict, travel_minutes, user_prefs: dict, actions=None) -> dict:
+        """Các thành phần phần thưởng khi đi tới actions (mặc định mọi địa điểm, theo trục cuối của travel_minutes)."""
+        catalogue = self.catalogue
+        if actions is None:
+            actions = slice(None)
+        match = self.type_match((user_prefs or {}).get("preferred_type", ""))
+        terms = reward_terms(
+            self.weights, weather_term(weather, self.weights), travel_minutes, match[actions],
+            catalogue.prices[actions], catalogue.popularity[actions], catalogue.sentiment[actions],
+        )
+        shape = np.broadcast_shapes(*(np.shape(value) for value in terms.values()))
+        return {name: np.broadcast_to(value, shape) for name, value in terms.items()}
+
+    def rewards(self, weather: dict, travel_minutes, user_prefs: dict, actions=None) -> np.ndarray:
+        return sum(self.breakdown(weather, travel_minutes, user_prefs, actions).values())
+
+    def destination_rewards(self, weather: dict, user_prefs: dict) -> np.ndarray:
+        """Phần thưởng của mỗi điểm đến khi chưa tính thời gian di chuyển (vector N)."""
+        return self.rewards(weather, 0.0, user_prefs)
+
+    def reward_matrix(self, weather: dict, travel_minutes: np.ndarray, user_prefs: dict) -> np.ndarray:
+        """Ma trận phần thưởng N×N cho mọi chuyển tiếp (hàng: điểm xuất phát, cột: điểm đến)."""
+        return self.destination_rewards(weather, user_prefs)[None, :] + travel_minutes * self.weights["travel_minute"]
@@ -5,43 +5,83 @@ import json
 import mysql.connector
 import numpy as np
 from fastapi import APIRouter, HTTPException, Body, Query
-from app.services import get_current_weather, get_travel_time, get_coordinates
-from transformers import pipeline
+from app.services import (
+    get_current_weather, get_travel_time, get_coordinates, get_city_id, get_db_connection, format_duration,
+    city_registry,
+)
+from app.ors_client import ors_request, Priority, ORSRateLimitError
+from app.sentiment_backends import get_sentiment_backend
+from app.sentiment_store import get_destination_sentiment
+from app.review_queue import review_queue, ReviewQueueFull
+from app.metrics import record_cache, stage_timer
+from app.catalogue import DestinationCatalogue
+from app.sparse_qtable import TopKQTable
+from app.snapshots import CitySnapshot, SnapshotStore, SNAPSHOT_MATRIX_MAX
+from app.travel_matrix import load_travel_matrix
+from app.trip_planner import TripPlanner
+from app.rewards import RewardEngine, load_weights, reward_terms, weather_term
+from app.utils import log_every_seconds
+from app.invalidation import on_city_invalidated, refresh_city, invalidate_city
+from cachetools import TTLCache
 import structlog
-import unicodedata
-import re
 
+# Các endpoint gọi MySQL/ORS đồng bộ nên khai báo def: FastAPI chạy chúng trong threadpool, không chặn event loop
 router = APIRouter()
 logger = structlog.get_logger()
+# (city_id, tên địa điểm) -> destination_id cho /submit_review
+destination_id_cache = TTLCache(maxsize=10000, ttl=600)
+# Định dạng Q-table: dense (N×N), topk (N×k successor) hoặc auto (topk khi số địa điểm vượt ngưỡng)
+Q_TABLE_FORMAT = os.getenv("Q_TABLE_FORMAT", "auto")
+Q_TABLE_TOP_K = int(os.getenv("Q_TABLE_TOP_K", 32))
+Q_TABLE_SPARSE_THRESHOLD = int(os.getenv("Q_TABLE_SPARSE_THRESHOLD", 1000))
+# Số điểm đến tối đa một lần gọi /reward_breakdown được trả về
+REWARD_BREAKDOWN_MAX_LIMIT = int(os.getenv("REWARD_BREAKDOWN_MAX_LIMIT", 100))
+
+
+@on_city_invalidated
+def clear_city_caches(city_id: int):
+    city_snapshots.invalidate(city_id)
+    for key in [key for key in list(destination_id_cache) if key[0] == city_id]:
+        destination_id_cache.pop(key, None)
 
-def preprocess_vietnamese_text(text: str) -> str:
-    """Tiền xử lý văn bản tiếng Việt: chuẩn hóa dấu và loại bỏ ký tự đặc biệt."""
-    # Chuẩn hóa Unicode (NFC)
-    text = unicodedata.normalize('NFC', text)
-    # Chuyển thành chữ thường
-    text = text.lower()
-    # Loại bỏ ký tự đặc biệt, giữ chữ và số
-    text = re.sub(r'[^\w\s]', '', text)
-    return text
 
 class TravelRecommender:
-    def __init__(self, city: str):
-        """Khởi tạo TravelRecommender với danh sách địa điểm, Q-table và phân tích cảm xúc."""
+    def __init__(self, city: str, load_snapshot: bool = True):
+        """Khởi tạo TravelRecommender trên snapshot hiện hành của thành phố.
+
+        Với load_snapshot=False, địa điểm được đọc thẳng từ database (dùng khi dựng snapshot mới).
+        """
         self.city = city
         self.city_id = self.get_city_id(city)
+        # Dữ liệu thành phố vừa được nhập lại thì bỏ cache cũ trước khi dùng
+        refresh_city(self.city_id)
         self.destinations = []
         self.n_states = 0
         self.q_table = None
-        # Sử dụng mô hình multilingual cho phân tích cảm xúc
-        self.sentiment_analyzer = pipeline(
-            "sentiment-analysis",
-            model="nlptown/bert-base-multilingual-uncased-sentiment",
-            device=-1
-        )
-        self.load_destinations()
+        self.catalogue = None
+        self.snapshot = None
+        if load_snapshot:
+            self.pin(city_snapshots.get(city))
+        else:
+            self.load_destinations()
+
+    def pin(self, snapshot: CitySnapshot):
+        """Dùng một snapshot cho cả request để địa điểm, danh mục và Q-table luôn khớp chỉ số."""
+        self.snapshot = snapshot
+        self.destinations = snapshot.destinations
+        self.n_states = snapshot.n_states
+        self.catalogue = snapshot.catalogue
+        self.q_table = snapshot.q_table
+
+    @property
+    def sentiment_backend(self):
+        """Mô hình multilingual cho phân tích cảm xúc, chỉ nạp khi thực sự cần."""
+        return get_sentiment_backend()
 
     def get_city_id(self, city: str) -> int:
         """Lấy city_id từ bảng cities dựa trên tên thành phố."""
+        if city in city_registry:
+            return city_registry[city]
         try:
             conn = mysql.connector.connect(
                 host=os.getenv("DB_HOST", "db"),
@@ -56,6 +96,7 @@ class TravelRecommender:
             conn.close()
             if result:
                 logger.info("Fetched city_id", city=city, city_id=result[0])
+                city_registry[city] = result[0]
                 return result[0]
             logger.error("City not found", city=city)
             raise ValueError(f"City {city} not found in database")
@@ -63,6 +104,7 @@ class TravelRecommender:
             logger.error("Error fetching city_id", error=str(e))
             raise
 
+    @stage_timer("db")
     def load_destinations(self):
         try:
             conn = mysql.connector.connect(
@@ -72,15 +114,22 @@ class TravelRecommender:
                 database=os.getenv("DB_NAME", "travel_recommendation")
             )
             cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT id, name, type, ticket_price, popularity, sentiment_score FROM destinations WHERE city_id = %s", (self.city_id,))
+            # Thứ tự theo id cố định chỉ số hàng/cột Q-table; địa điểm mới luôn nằm cuối danh sách
+            cursor.execute("SELECT id, name, type, ticket_price, popularity, sentiment_score, latitude, longitude FROM destinations WHERE city_id = %s ORDER BY id", (self.city_id,))
             self.destinations = cursor.fetchall()
             self.n_states = len(self.destinations)
-            
-            # Lấy hình ảnh cho mỗi địa điểm
+
+            # Lấy hình ảnh của mọi địa điểm trong một truy vấn
+            cursor.execute(
+                "SELECT i.destination_id, i.image_url FROM destination_images i "
+                "JOIN destinations d ON d.id = i.destination_id WHERE d.city_id = %s ORDER BY i.id",
+                (self.city_id,)
+            )
+            images = {}
+            for row in cursor.fetchall():
+                images.setdefault(row["destination_id"], []).append(row["image_url"])
             for dest in self.destinations:
-                cursor.execute("SELECT image_url FROM destination_images WHERE destination_id = %s", (dest["id"],))
-                images = [row["image_url"] for row in cursor.fetchall()]
-                dest["images"] = images  # Thêm danh sách hình ảnh vào địa điểm
+                dest["images"] = images.get(dest["id"], [])
 
             cursor.close()
             conn.close()
@@ -105,42 +154,45 @@ class TravelRecommender:
                     conn.commit()
                     cursor.close()
                     conn.close()
+            self.catalogue = DestinationCatalogue(self.destinations)
         except Exception as e:
             logger.error("Error loading destinations", error=str(e))
             raise
 
     def calculate_destination_sentiment(self, destination_id: int) -> float:
-        """Tính điểm cảm xúc trung bình cho một địa điểm dựa trên bình luận."""
+        """Tính điểm cảm xúc trung bình cho một địa điểm dựa trên bình luận.
+
+        Điểm từng bình luận được lưu trong review_sentiments, chỉ bình luận mới hoặc đã sửa mới cần chấm lại.
+        """
         try:
-            conn = mysql.connector.connect(
-                host=os.getenv("DB_HOST", "db"),
-                user=os.getenv("DB_USER", "root"),
-                password=os.getenv("DB_PASSWORD"),
-                database=os.getenv("DB_NAME", "travel_recommendation")
-            )
-            cursor = conn.cursor()
-            cursor.execute("SELECT review_text FROM reviews WHERE destination_id = %s", (destination_id,))
-            reviews = [row[0] for row in cursor.fetchall()]
-            logger.info("Fetched reviews", destination_id=destination_id, reviews=reviews, count=len(reviews))
-            cursor.close()
-            conn.close()
-            if not reviews:
-                logger.info("No reviews found", destination_id=destination_id)
-                return 0.0
-            # Tiền xử lý bình luận
-            processed_reviews = [preprocess_vietnamese_text(review) for review in reviews]
-            logger.info("Processed reviews", destination_id=destination_id, processed_reviews=processed_reviews)
-            # Phân tích cảm xúc
-            sentiments = self.sentiment_analyzer(processed_reviews)
-            logger.info("Sentiment analysis results", destination_id=destination_id, sentiments=sentiments)
-            # Chuyển điểm từ 1-5 sang [-1, 1]
-            avg_score = sum((int(s["label"].split()[0]) - 3) / 2.0 for s in sentiments) / len(sentiments)
+            avg_score = get_destination_sentiment(destination_id)
             logger.info("Calculated sentiment score", destination_id=destination_id, score=avg_score)
             return avg_score
         except Exception as e:
             logger.error("Error calculating sentiment", error=str(e), exc_info=True)
             return 0.0
 
+    @property
+    def sparse_q_table(self) -> bool:
+        return isinstance(self.q_table, TopKQTable)
+
+    def use_sparse_q_table(self) -> bool:
+        if Q_TABLE_FORMAT == "auto":
+            return self.n_states > Q_TABLE_SPARSE_THRESHOLD
+        return Q_TABLE_FORMAT == TopKQTable.FORMAT
+
+    def new_q_table(self):
+        """Q-table rỗng; bản thưa khởi tạo với k địa điểm gần nhất của mỗi trạng thái."""
+        if self.use_sparse_q_table():
+            return TopKQTable.nearest(self.catalogue.latitude, self.catalogue.longitude, Q_TABLE_TOP_K)
+        return np.zeros((self.n_states, self.n_states))
+
+    def q_table_matches(self, q_table) -> bool:
+        if isinstance(q_table, TopKQTable):
+            return q_table.n_states == self.n_states
+        return q_table.shape == (self.n_states, self.n_states)
+
+    @stage_timer("q_table_load")
     def load_q_table(self):
         """Tải Q-table từ database."""
         try:
@@ -154,19 +206,27 @@ class TravelRecommender:
             cursor.execute("SELECT q_table FROM q_tables WHERE city_id = %s", (self.city_id,))
             result = cursor.fetchone()
             if result:
-                q_table_list = json.loads(result[0])
-                self.q_table = np.array(q_table_list, dtype=np.float64)
+                data = json.loads(result[0])
+                if isinstance(data, dict) and data.get("format") == TopKQTable.FORMAT:
+                    self.q_table = TopKQTable.from_dict(data)
+                else:
+                    self.q_table = np.array(data, dtype=np.float64)
+                    if self.use_sparse_q_table():
+                        self.q_table = TopKQTable.from_dense(self.q_table, Q_TABLE_TOP_K)
+                if not self.q_table_matches(self.q_table):
+                    # Số địa điểm đã thay đổi kể từ lần huấn luyện, Q-table cũ không còn khớp chỉ số
+                    logger.warning("Stale Q-table shape, retraining required", city=self.city, n_states=self.n_states)
+                    self.q_table = self.new_q_table()
             else:
-                self.q_table = np.zeros((self.n_states, self.n_states))
-            self.q_table.flags.writeable = True
+                self.q_table = self.new_q_table()
             cursor.close()
             conn.close()
             logger.info("Loaded Q-table", city=self.city)
         except Exception as e:
             logger.error("Error loading Q-table", error=str(e))
-            self.q_table = np.zeros((self.n_states, self.n_states))
-            self.q_table.flags.writeable = True
+            self.q_table = self.new_q_table()
 
+    @stage_timer("db")
     def save_q_table(self):
         """Lưu Q-table vào database."""
         try:
@@ -177,7 +237,10 @@ class TravelRecommender:
                 database=os.getenv("DB_NAME", "travel_recommendation")
             )
             cursor = conn.cursor()
-            q_table_json = json.dumps(self.q_table.tolist())
+            if self.sparse_q_table:
+                q_table_json = json.dumps(self.q_table.to_dict())
+            else:
+                q_table_json = json.dumps(self.q_table.tolist())
             cursor.execute(
                 "INSERT INTO q_tables (city_id, q_table) VALUES (%s, %s) ON DUPLICATE KEY UPDATE q_table = %s",
                 (self.city_id, q_table_json, q_table_json)
@@ -186,131 +249,196 @@ class TravelRecommender:
             cursor.close()
             conn.close()
             logger.info("Saved Q-table", city=self.city)
+            if self.snapshot is not None:
+                city_snapshots.publish_q_table(self.snapshot, self.q_table)
+            # Các worker khác nạp lại snapshot (kèm Q-table mới) ở request kế tiếp thay vì chờ hết SNAPSHOT_TTL
+            invalidate_city(self.city_id, local=self.snapshot is None)
         except Exception as e:
             logger.error("Error saving Q-table", error=str(e))
 
-    def train(self, episodes: int, user_prefs: dict = None):
-        """Huấn luyện mô hình Q-learning với điểm cảm xúc."""
-        self.load_q_table()
+    def train(self, episodes: int, user_prefs: dict = None, reward_weights: dict = None):
+        """Huấn luyện mô hình Q-learning với điểm cảm xúc.
+
+        Phần thưởng của mọi chuyển tiếp đã biết thời gian di chuyển được tính trước thành ma trận (RewardEngine);
+        chỉ các cặp chưa biết mới tra cache/database/ORS trong vòng lặp.
+        """
+        if self.snapshot is not None:
+            # Huấn luyện trên bản sao; các request khác vẫn đọc Q-table chỉ đọc của snapshot
+            self.q_table = self.snapshot.q_table.copy()
+        else:
+            self.load_q_table()
         alpha = 0.1  # Tỷ lệ học
         gamma = 0.9  # Hệ số chiết khấu
         epsilon = 0.1  # Tỷ lệ khám phá
         user_prefs = user_prefs or {}
+        # Chỉ log khoảng 10 lần mỗi lượt huấn luyện thay vì từng episode
+        log_interval = max(1, episodes // 10)
+        sparse = self.sparse_q_table
+
+        # Thời tiết là của cả thành phố nên chỉ lấy một lần cho lượt huấn luyện
+        weather = get_current_weather(self.city)
+        if "error" in weather:
+            logger.warning("Failed to get weather, training skipped", city=self.city, error=weather["error"])
+            raise ValueError(f"Cannot train without weather data: {weather['error']}")
+        engine = RewardEngine(self.catalogue, reward_weights)
+        destination_rewards = engine.destination_rewards(weather, user_prefs)
+        travel_weight = engine.weights["travel_minute"]
+        travel_matrix = self.snapshot.travel_matrix if self.snapshot is not None else None
+        rewards = None
+        if travel_matrix is not None and not sparse:
+            rewards = engine.reward_matrix(weather, travel_matrix.minutes(), user_prefs)
         for episode in range(episodes):
             current_state = np.random.randint(self.n_states)
             for _ in range(3):  # 3 bước mỗi episode
+                # Với Q-table thưa, hành động chỉ chọn trong k successor của trạng thái hiện tại
                 if np.random.uniform(0, 1) < epsilon:
-                    action = np.random.randint(self.n_states)
+                    action = self.q_table.random_successor(current_state) if sparse else np.random.randint(self.n_states)
                 else:
-                    action = np.argmax(self.q_table[current_state])
-                destination = self.destinations[action]["name"]
-                weather = get_current_weather(self.city)
-                travel_time = get_travel_time(
-                    self.destinations[current_state]["name"],
-                    destination,
-                    self.city
-                )
-                if "error" in weather or "error" in travel_time or travel_time.get("duration") == "N/A":
-                    logger.warning("Failed to get valid data", destination=destination)
-                    continue
-                reward = self.calculate_reward(weather, travel_time, self.destinations[action], user_prefs)
+                    action = self.q_table.best_successor(current_state) if sparse else np.argmax(self.q_table[current_state])
+                reward = rewards[current_state, action] if rewards is not None else np.nan
+                if np.isnan(reward):
+                    minutes = self.travel_minutes(current_state, action, priority=Priority.BACKGROUND)
+                    if np.isnan(minutes):
+                        if log_every_seconds("train_invalid_data", 5):
+                            logger.warning("Failed to get valid data", destination=self.destinations[action]["name"])
+                        continue
+                    reward = destination_rewards[action] + travel_weight * minutes
                 next_state = action
-                self.q_table[current_state, action] = self.q_table[current_state, action] + alpha * (
-                    reward + gamma * np.max(self.q_table[next_state]) - self.q_table[current_state, action]
-                )
+                if sparse:
+                    self.q_table.update(current_state, action, reward, alpha, gamma)
+                else:
+                    self.q_table[current_state, action] = self.q_table[current_state, action] + alpha * (
+                        reward + gamma * np.max(self.q_table[next_state]) - self.q_table[current_state, action]
+                    )
                 current_state = next_state
-            logger.info("Completed training episode", episode=episode + 1, total=episodes)
+            if (episode + 1) % log_interval == 0 or episode + 1 == episodes:
+                logger.info("Completed training episode", episode=episode + 1, total=episodes)
         self.save_q_table()
 
-    def calculate_reward(self, weather: dict, travel_time: dict, destination: dict, user_prefs: dict) -> float:
-        """Tính phần thưởng dựa trên thời tiết, thời gian di chuyển, sở thích và cảm xúc."""
-        reward = 0
-        if "clear" in weather.get("description", "").lower():
-            reward += 10
-        elif "rain" in weather.get("description", "").lower():
-            reward -= 5
-        reward += weather.get("temperature", 0) * 0.2
-
-        duration = float(travel_time.get("duration", "0").split()[0]) if travel_time.get("duration") != "N/A" else 0
-        reward -= duration * 0.5
-
-        if user_prefs.get("preferred_type") and user_prefs.get("preferred_type") == destination.get("type"):
-            reward += 15
-        ticket_price = destination.get("ticket_price", 0)
-        reward -= ticket_price / 10000
-        reward += destination.get("popularity", 0) * 2
-        # Thêm điểm cảm xúc vào phần thưởng
-        reward += destination.get("sentiment_score", 0.0) * 10
-        return reward
-
-    def recommend_route(self, user_prefs: dict, steps: int) -> list:
+    def travel_time(self, start: int, end: int, priority: Priority = Priority.USER) -> dict:
+        """Thời gian di chuyển giữa hai chỉ số địa điểm: tra trong snapshot trước, sau đó cache/database/ORS."""
+        if self.snapshot is not None:
+            known = self.snapshot.travel_time(start, end)
+            if known is not None:
+                return known
+        return get_travel_time(self.destinations[start]["name"], self.destinations[end]["name"], self.city,
+                               priority=priority)
+
+    def travel_minutes(self, start: int, end: int, priority: Priority = Priority.USER) -> float:
+        """Thời gian di chuyển (phút) giữa hai chỉ số địa điểm, NaN nếu không lấy được."""
+        matrix = self.snapshot.travel_matrix if self.snapshot is not None else None
+        if matrix is not None and not np.isnan(matrix.seconds[start, end]):
+            return float(matrix.seconds[start, end]) / 60
+        travel_time = self.travel_time(start, end, priority=priority)
+        if "error" in travel_time:
+            return np.nan
+        return travel_time["duration_seconds"] / 60
+
+    def calculate_reward(self, weather: dict, travel_time: dict, destination: dict, user_prefs: dict,
+                         reward_weights: dict = None) -> float:
+        """Tính phần thưởng của một chuyển tiếp (bản vô hướng của RewardEngine, cùng hệ số)."""
+        weights = load_weights(reward_weights)
+        seconds = travel_time.get("duration_seconds")
+        preferred_type = user_prefs.get("preferred_type")
+        terms = reward_terms(
+            weights, weather_term(weather, weights), 0.0 if seconds is None else seconds / 60,
+            bool(preferred_type) and preferred_type == destination.get("type"),
+            destination.get("ticket_price") or 0, destination.get("popularity") or 0,
+            destination.get("sentiment_score") or 0.0,
+        )
+        return float(sum(terms.values()))
+
+    @stage_timer("route_search")
+    def recommend_route(self, user_prefs: dict, steps: int, explain: bool = False, reward_weights: dict = None) -> list:
+        """Lộ trình theo Q-table; explain=True kèm phân tích phần thưởng của từng bước theo reward_weights."""
         if self.q_table is None:
             self.load_q_table()
-        if not np.any(self.q_table):
+        sparse = self.sparse_q_table
+        if not (self.q_table.is_trained() if sparse else np.any(self.q_table)):
             logger.error("Q-table not trained", city=self.city)
             raise ValueError("Q-table not trained")
 
         preferred_type = user_prefs.get("preferred_type", "")
         max_budget = user_prefs.get("max_budget", float("inf"))
 
-        valid_destinations = [
-            i for i, dest in enumerate(self.destinations)
-            if (not preferred_type or dest["type"] == preferred_type)
-            and (dest.get("ticket_price", 0) <= max_budget)
-        ]
-        if not valid_destinations:
+        catalogue = self.catalogue
+        candidates = catalogue.candidate_mask(preferred_type, max_budget)
+        n_candidates = int(candidates.sum())
+        if not n_candidates:
             logger.error("No destinations match user preferences", user_prefs=user_prefs)
             raise ValueError("No destinations match your preferences or budget")
 
         route = []
-        current_state = np.random.choice(valid_destinations)
-        visited = set()
+        current_state = int(np.random.choice(np.flatnonzero(candidates)))
         total_budget = 0
-
-        for _ in range(min(steps, len(valid_destinations))):
-            valid_actions = [
-                i for i in valid_destinations
-                if self.destinations[i]["name"] not in visited
-            ]
-            if not valid_actions:
+        weather = get_current_weather(self.city)
+        engine = RewardEngine(catalogue, reward_weights) if explain else None
+
+        for _ in range(min(steps, n_candidates)):
+            # Chỉ giữ các địa điểm còn vừa ngân sách còn lại
+            candidates &= catalogue.prices <= max_budget - total_budget
+            if sparse:
+                action = self.q_table.best_next(current_state, candidates)
+                if action < 0:
+                    # Không còn successor hợp lệ: chọn ứng viên có điểm tĩnh (phổ biến, cảm xúc, giá) cao nhất
+                    action = catalogue.best_next(catalogue.static_scores, candidates)
+            else:
+                action = catalogue.best_next(self.q_table[current_state], candidates)
+            if action < 0:
                 break
-
-            action = max(valid_actions, key=lambda x: self.q_table[current_state][x])
             destination = self.destinations[action]["name"]
             ticket_price = self.destinations[action].get("ticket_price", 0)
+            catalogue.mark_visited(candidates, action)
 
-            if total_budget + ticket_price > max_budget:
-                logger.warning("Exceeds budget", destination=destination, total_budget=total_budget)
-                continue
-
-            weather = get_current_weather(self.city)
-            travel_time = get_travel_time(
-                self.destinations[current_state]["name"],
-                destination,
-                self.city
-            )
-            if "error" in weather or "error" in travel_time or travel_time.get("duration") == "N/A":
-                logger.warning("Failed to get valid data", destination=destination)
+            travel_time = self.travel_time(current_state, action)
+            if "error" in weather or "error" in travel_time:
+                if log_every_seconds("recommend_invalid_data", 5):
+                    logger.warning("Failed to get valid data", destination=destination)
                 continue
 
             total_budget += ticket_price
-            route.append({
+            stop = {
                 "destination": destination,
                 "weather": weather.get("description", "N/A"),
                 "temperature": weather.get("temperature", "N/A"),
-                "travel_time": travel_time.get("duration", "N/A"),
+                "travel_time": format_duration(travel_time["duration_seconds"]),
+                "travel_seconds": round(travel_time["duration_seconds"], 1),
                 "ticket_price": ticket_price,
                 "sentiment_score": self.destinations[action].get("sentiment_score", 0.0),
                 "images": self.destinations[action].get("images", [])
-            })
-            visited.add(destination)
+            }
+            if engine is not None:
+                minutes = travel_time["duration_seconds"] / 60
+                stop["reward"] = explain_reward(engine.breakdown(weather, minutes, user_prefs, action))
+            route.append(stop)
             current_state = action
 
         if not route:
             raise ValueError("Could not generate a valid route")
         return route
+def explain_reward(breakdown: dict, index=()) -> dict:
+    """Các thành phần phần thưởng (và tổng) của một chuyển tiếp, dạng JSON."""
+    terms = {name: round(float(value[index]), 4) for name, value in breakdown.items()}
+    terms["total"] = round(sum(terms.values()), 4)
+    return terms
+
+@stage_timer("snapshot_build")
+def build_city_snapshot(city: str) -> CitySnapshot:
+    """Dựng snapshot mới của thành phố từ database: địa điểm, Q-table và ma trận thời gian di chuyển đã lưu."""
+    recommender = TravelRecommender(city, load_snapshot=False)
+    recommender.load_q_table()
+    travel_matrix = None
+    if recommender.n_states <= SNAPSHOT_MATRIX_MAX:
+        travel_matrix = load_travel_matrix(recommender.city_id, recommender.catalogue.names)
+    return CitySnapshot(
+        city, recommender.city_id, recommender.destinations, recommender.catalogue, recommender.q_table,
+        travel_matrix
+    )
+
+city_snapshots = SnapshotStore(build_city_snapshot)
+
 @router.get("/destination/{destination_id}")
-async def get_destination_details(destination_id: int):
+def get_destination_details(destination_id: int):
     """Endpoint để lấy chi tiết một địa điểm và các bình luận."""
     try:
         conn = mysql.connector.connect(
@@ -348,11 +476,12 @@ async def get_destination_details(destination_id: int):
         logger.error("Error fetching destination details", error=str(e))
         raise HTTPException(status_code=500, detail=f"Failed to fetch destination details: {str(e)}")
 @router.post("/train")
-async def train_model(request: dict = Body(...)):
+def train_model(request: dict = Body(...)):
     """Endpoint để huấn luyện mô hình."""
     city = request.get("city")
     episodes = request.get("episodes", 100)
     user_prefs = request.get("user_prefs", None)
+    reward_weights = request.get("reward_weights", None)
 
     if not city:
         logger.error("Missing city parameter")
@@ -361,25 +490,29 @@ async def train_model(request: dict = Body(...)):
     logger.info("Received train request", city=city, episodes=episodes, user_prefs=user_prefs)
     try:
         recommender = TravelRecommender(city)
-        recommender.train(episodes, user_prefs)
+        recommender.train(episodes, user_prefs, reward_weights)
         return {"message": f"Training completed for {city}"}
+    except ValueError as e:
+        logger.error("Training failed", error=str(e))
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error("Training failed", error=str(e))
         raise HTTPException(status_code=500, detail=f"Training failed: {str(e)}")
 
 @router.get("/recommend")
-async def recommend_route(
+def recommend_route(
     city: str,
     steps: int = Query(3, ge=1),
     preferred_type: str = Query("", description="Preferred destination type (e.g., natural, cultural)"),
-    max_budget: float = Query(float("inf"), ge=0, description="Maximum budget for ticket prices")
+    max_budget: float = Query(float("inf"), ge=0, description="Maximum budget for ticket prices"),
+    explain: bool = Query(False, description="Include the per-term reward breakdown of each step")
 ):
     """Endpoint để đề xuất lộ trình."""
     logger.info("Received recommend request", city=city, steps=steps, preferred_type=preferred_type, max_budget=max_budget)
     try:
         recommender = TravelRecommender(city)
         user_prefs = {"preferred_type": preferred_type, "max_budget": max_budget}
-        route = recommender.recommend_route(user_prefs, steps)
+        route = recommender.recommend_route(user_prefs, steps, explain=explain)
         if not route:
             raise HTTPException(status_code=404, detail="No route found")
         return route
@@ -390,8 +523,99 @@ async def recommend_route(
         logger.error("Recommendation failed", error=str(e))
         raise HTTPException(status_code=500, detail=f"Recommendation failed: {str(e)}")
 
+@router.post("/reward_breakdown")
+def get_reward_breakdown(request: dict = Body(...)):
+    """Xếp hạng các điểm đến theo phần thưởng kèm từng thành phần, để giải thích và chỉnh hệ số mà không huấn luyện lại.
+
+    Nếu có from_destination, thành phần travel dùng thời gian di chuyển đã lưu từ điểm đó (null nếu chưa biết).
+    """
+    city = request.get("city")
+    if not city:
+        logger.error("Missing city parameter")
+        raise HTTPException(status_code=400, detail="City is required")
+    user_prefs = {"preferred_type": request.get("preferred_type", "")}
+    limit = request.get("limit", 10)
+    # bool cũng là int trong Python nên phải loại riêng
+    if isinstance(limit, bool) or not isinstance(limit, int) or not 1 <= limit <= REWARD_BREAKDOWN_MAX_LIMIT:
+        logger.error("Invalid limit parameter", limit=limit)
+        raise HTTPException(status_code=400,
+                            detail=f"limit must be an integer between 1 and {REWARD_BREAKDOWN_MAX_LIMIT}")
+
+    try:
+        recommender = TravelRecommender(city)
+        engine = RewardEngine(recommender.catalogue, request.get("reward_weights"))
+        weather = get_current_weather(city)
+        if "error" in weather:
+            raise ValueError(weather["error"])
+
+        travel_minutes = np.zeros(recommender.n_states)
+        origin = request.get("from_destination")
+        if origin:
+            names = recommender.catalogue.names
+            if origin not in names:
+                raise ValueError(f"Destination {origin} not found in {city}")
+            start = names.index(origin)
+            matrix = recommender.snapshot.travel_matrix
+            travel_minutes = matrix.seconds[start] / 60 if matrix is not None else np.full(recommender.n_states, np.nan)
+
+        breakdown = engine.breakdown(weather, travel_minutes, user_prefs)
+        totals = np.nan_to_num(sum(breakdown.values()), nan=-np.inf)
+        if origin:
+            # Không xếp hạng chính điểm xuất phát
+            others = np.ones(recommender.n_states, dtype=bool)
+            recommender.catalogue.mark_visited(others, start)
+            totals = np.where(others, totals, -np.inf)
+        ranking = np.argsort(-totals, kind="stable")[:limit]
+        return {
+            "weights": engine.weights,
+            "weather": weather,
+            "destinations": [
+                {
+                    "destination": recommender.destinations[i]["name"],
+                    "type": recommender.destinations[i].get("type"),
+                    "reward": {
+                        name: None if np.isnan(value) else value
+                        for name, value in explain_reward(breakdown, i).items()
+                    },
+                }
+                for i in ranking
+            ]
+        }
+    except ValueError as e:
+        logger.error("Reward breakdown failed", error=str(e))
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Reward breakdown failed", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Reward breakdown failed: {str(e)}")
+
+@router.post("/recommend_trip")
+def recommend_trip(request: dict = Body(...)):
+    """Endpoint để đề xuất lịch trình nhiều thành phố, chia theo ngày."""
+    cities = request.get("cities") or []
+    days = request.get("days", len(cities))
+    stops_per_day = request.get("stops_per_day", 3)
+    user_prefs = {
+        "preferred_type": request.get("preferred_type", ""),
+        "max_budget": request.get("max_budget", float("inf")),
+    }
+
+    if not cities:
+        logger.error("Missing cities parameter")
+        raise HTTPException(status_code=400, detail="At least one city is required")
+
+    logger.info("Received trip request", cities=cities, days=days, stops_per_day=stops_per_day, user_prefs=user_prefs)
+    try:
+        planner = TripPlanner(TravelRecommender)
+        return planner.plan(cities, days, stops_per_day, user_prefs, keep_order=request.get("keep_order", False))
+    except ValueError as e:
+        logger.error("Trip recommendation failed", error=str(e))
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Trip recommendation failed", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Trip recommendation failed: {str(e)}")
+
 @router.get("/coordinates")
-async def get_location_coordinates(
+def get_location_coordinates(
     location: str,
     city: str
 ):
@@ -412,80 +636,100 @@ async def get_location_coordinates(
         logger.error("Coordinates request failed", error=str(e))
         raise HTTPException(status_code=500, detail=f"Failed to get coordinates: {str(e)}")
 
-@router.post("/submit_review")
-async def submit_review(request: dict = Body(...)):
-    """Endpoint để gửi bình luận cho một địa điểm, lưu điểm cảm xúc vào reviews và cập nhật điểm tổng trong destinations."""
-    city = request.get("city")
-    destination_name = request.get("destination_name")
-    review_text = request.get("review_text")
-
-    if not all([city, destination_name, review_text]):
-        logger.error("Missing required parameters", request=request)
-        raise HTTPException(status_code=400, detail="City, destination_name, and review_text are required")
-
+def get_destination_id(city: str, destination_name: str) -> int:
+    """Tra destination_id theo thành phố và tên địa điểm (có cache)."""
+    city_id = get_city_id(city)
+    key = (city_id, destination_name)
+    destination_id = destination_id_cache.get(key)
+    record_cache("destination_id", destination_id is not None, len(destination_id_cache))
+    if destination_id is not None:
+        return destination_id
+    conn = get_db_connection()
     try:
-        # Lấy city_id và destination_id
-        city_id = TravelRecommender(city).city_id
-        conn = mysql.connector.connect(
-            host=os.getenv("DB_HOST", "db"),
-            user=os.getenv("DB_USER", "root"),
-            password=os.getenv("DB_PASSWORD"),
-            database=os.getenv("DB_NAME", "travel_recommendation")
-        )
         cursor = conn.cursor()
         cursor.execute(
             "SELECT id FROM destinations WHERE name = %s AND city_id = %s",
             (destination_name, city_id)
         )
         result = cursor.fetchone()
-        if not result:
-            cursor.close()
-            conn.close()
-            raise ValueError(f"Destination {destination_name} not found in {city}")
-
-        destination_id = result[0]
-        logger.info("Found destination", destination_id=destination_id, destination_name=destination_name)
-
-        # Tính sentiment_score cho bình luận
-        recommender = TravelRecommender(city)
-        processed_review = preprocess_vietnamese_text(review_text)
-        sentiment_result = recommender.sentiment_analyzer([processed_review])[0]
-        sentiment_score = (int(sentiment_result["label"].split()[0]) - 3) / 2.0
-        logger.info("Calculated sentiment score for review", review_text=review_text, sentiment_score=sentiment_score)
-
-        # Thêm bình luận cùng với sentiment_score vào bảng reviews
-        cursor.execute(
-            "INSERT INTO reviews (destination_id, review_text, sentiment_score, created_at) "
-            "VALUES (%s, %s, %s, NOW())",
-            (destination_id, review_text, sentiment_score)
-        )
-
-        # Cập nhật sentiment_score tổng trong bảng destinations
-        cursor.execute(
-            "UPDATE destinations SET sentiment_score = COALESCE(sentiment_score, 0) + %s WHERE id = %s",
-            (sentiment_score, destination_id)
-        )
-
-        conn.commit()
         cursor.close()
+    finally:
         conn.close()
-        logger.info("Review submitted and sentiment updated", 
-                    destination_name=destination_name, 
-                    review_sentiment_score=sentiment_score)
-        
+    if not result:
+        raise ValueError(f"Destination {destination_name} not found in {city}")
+    destination_id_cache[key] = result[0]
+    return result[0]
+
+@router.post("/submit_review", status_code=202)
+def submit_review(request: dict = Body(...)):
+    """Endpoint để gửi bình luận cho một địa điểm.
+
+    Bình luận được đưa vào hàng đợi ghi sau và trả về review_id ngay; điểm cảm xúc, bảng reviews và điểm tổng
+    trong destinations được cập nhật theo lô (xem app.review_queue).
+    """
+    city = request.get("city")
+    destination_name = request.get("destination_name")
+    review_text = request.get("review_text")
+
+    if not all([city, destination_name, review_text]):
+        logger.error("Missing required parameters", request=request)
+        raise HTTPException(status_code=400, detail="City, destination_name, and review_text are required")
+
+    try:
+        destination_id = get_destination_id(city, destination_name)
+        review_id = review_queue.submit(destination_id, review_text)
+        if log_every_seconds("review_queued", 5):
+            logger.info("Review queued", review_id=review_id, destination_id=destination_id)
         return {
-            "message": f"Review submitted for {destination_name}",
-            "sentiment_score": sentiment_score
+            "message": f"Review accepted for {destination_name}",
+            "review_id": review_id,
+            "status": "queued"
         }
+    except ReviewQueueFull as e:
+        logger.warning("Review queue full", retry_after=e.retry_after)
+        raise HTTPException(
+            status_code=503,
+            detail="Too many reviews pending, please retry later",
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except ValueError as e:
         logger.error("Review submission failed", error=str(e))
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error("Review submission failed", error=str(e))
         raise HTTPException(status_code=500, detail=f"Failed to submit review: {str(e)}")
+
+@router.get("/review_status/{review_id}")
+def get_review_status(review_id: str):
+    """Trạng thái của bình luận đã gửi: queued (đang chờ ghi) hoặc stored (đã ghi và chấm điểm)."""
+    if review_id in review_queue.pending:
+        return {"review_id": review_id, "status": "queued"}
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT destination_id, sentiment_score, created_at FROM reviews WHERE submission_id = %s",
+            (review_id,)
+        )
+        result = cursor.fetchone()
+        cursor.close()
+        conn.close()
+    except Exception as e:
+        logger.error("Review status lookup failed", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Failed to fetch review status: {str(e)}")
+    if not result:
+        # Có thể bình luận vẫn nằm trong hàng đợi của worker khác
+        raise HTTPException(status_code=404, detail="Review not found or not yet stored")
+    return {
+        "review_id": review_id,
+        "status": "stored",
+        "destination_id": result[0],
+        "sentiment_score": result[1],
+        "created_at": result[2]
+    }
     
 @router.post("/route")
-async def get_route_directions(request: dict = Body(...)):
+def get_route_directions(request: dict = Body(...)):
     """Lấy hướng dẫn tuyến đường từ ORS."""
     api_key = os.getenv("ORS_API_KEY")
     if not api_key:
@@ -497,16 +741,21 @@ async def get_route_directions(request: dict = Body(...)):
         logger.error("Invalid coordinates", coordinates=coordinates)
         raise HTTPException(status_code=400, detail="At least two coordinates are required")
 
-    # Method 1: API key as URL parameter
-    url = f"https://api.openrouteservice.org/v2/directions/driving-car/geojson?api_key={api_key}"
+    # API key truyền qua tham số URL
+    params = {"api_key": api_key}
     headers = {"Content-Type": "application/json"}
     body = {"coordinates": coordinates}
     
     # Debug logging
-    logger.info("Requesting route", url=url.replace(api_key, "API_KEY_HIDDEN"), coordinates=coordinates)
+    logger.info("Requesting route", coordinates=coordinates)
     
     try:
-        response = requests.post(url, json=body, headers=headers)
+        response = ors_request(
+            "directions", "POST", "/v2/directions/driving-car/geojson",
+            params=params,
+            json=body,
+            headers=headers
+        )
         
         # Log detailed info for debugging
         status_code = response.status_code
@@ -555,6 +804,13 @@ async def get_route_directions(request: dict = Body(...)):
             }
         }
         
+    except ORSRateLimitError as e:
+        logger.warning("Route request rate limited", error=str(e), retry_after=e.retry_after)
+        raise HTTPException(
+            status_code=429,
+            detail="Routing service is busy, please retry later",
+            headers={"Retry-After": str(int(e.retry_after) + 1)}
+        )
     except requests.exceptions.RequestException as e:
         logger.error("Request to ORS failed", error=str(e), exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to communicate with routing service: {str(e)}")
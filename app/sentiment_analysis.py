@@ -1,32 +1,20 @@
 # app/review_analyzer.py
-from transformers import pipeline
 import mysql.connector
 import os
 import structlog
 from cachetools import TTLCache
 from app.services import get_db_connection
+from app.model_loader import REVIEW_SENTIMENT_MODEL
+from app.sentiment_backends import get_sentiment_backend
+from app.text_processing import text_hash
+from app.metrics import record_cache
+from app.utils import log_every_n
 
 logger = structlog.get_logger()
 
 # Bộ nhớ đệm cho kết quả phân tích cảm xúc (TTL = 1 giờ)
 sentiment_cache = TTLCache(maxsize=1000, ttl=3600)
 
-# Khởi tạo pipeline phân tích cảm xúc
-try:
-    sentiment_analyzer = pipeline(
-        "sentiment-analysis",
-        model="cardiffnlp/twitter-xlm-roberta-base-sentiment",
-        tokenizer="cardiffnlp/twitter-xlm-roberta-base-sentiment",
-        return_all_scores=True,
-        max_length=512,
-        truncation=True,
-        device=0 if torch.cuda.is_available() else -1  # Dùng GPU nếu có
-    )
-    logger.info("Initialized sentiment analysis pipeline for Vietnamese")
-except Exception as e:
-    logger.error("Failed to initialize sentiment pipeline", error=str(e))
-    raise
-
 def analyze_review_sentiment(comment: str) -> float:
     """Phân tích cảm xúc của bình luận tiếng Việt và trả về điểm sentiment_score (0-5)."""
     try:
@@ -35,25 +23,28 @@ def analyze_review_sentiment(comment: str) -> float:
             logger.error("Invalid or empty comment", comment=comment)
             return 0.0
 
-        # Kiểm tra cache
-        if comment in sentiment_cache:
-            logger.info("Cache hit for sentiment analysis", comment=comment[:50])
-            return sentiment_cache[comment]
-
-        # Giới hạn độ dài bình luận
-        if len(comment) > 512:
-            comment = comment[:512]
+        # Kiểm tra cache theo hash của văn bản đã chuẩn hóa
+        cache_key = text_hash(comment)
+        cached = sentiment_cache.get(cache_key)
+        record_cache("sentiment", cached is not None, len(sentiment_cache))
+        if cached is not None:
+            if log_every_n("sentiment_cache_hit", 100):
+                logger.info("Cache hit for sentiment analysis", comment=comment[:50])
+            return cached
+
+        # XLM-R nhận văn bản gốc vì chữ hoa và dấu câu mang tín hiệu cảm xúc; dạng chuẩn hóa chỉ dùng làm khóa cache
+        text = comment
+        if len(text) > 512:
+            text = text[:512]
             logger.warning("Comment truncated to 512 characters", comment=comment[:50])
 
         # Phân tích cảm xúc
-        results = sentiment_analyzer(comment)[0]
-        # Kết quả: [{'label': 'positive', 'score': x}, {'label': 'neutral', 'score': y}, {'label': 'negative', 'score': z}]
+        results = get_sentiment_backend(REVIEW_SENTIMENT_MODEL).predict([text])[0]
+        # Kết quả: {'positive': x, 'neutral': y, 'negative': z}
 
         # Tính điểm dựa trên xác suất
         sentiment_score = 0.0
-        for result in results:
-            label = result["label"]
-            score = result["score"]
+        for label, score in results.items():
             if label == "positive":
                 sentiment_score += score * 5.0  # Tích cực: 5 điểm
             elif label == "neutral":
@@ -62,7 +53,7 @@ def analyze_review_sentiment(comment: str) -> float:
 
         # Chuẩn hóa về thang 0-5
         normalized_score = min(max(round(sentiment_score, 2), 0.0), 5.0)
-        sentiment_cache[comment] = normalized_score
+        sentiment_cache[cache_key] = normalized_score
         logger.info("Analyzed sentiment", comment=comment[:50], score=normalized_score)
         return normalized_score
     except Exception as e:
@@ -0,0 +1,242 @@
+import os
+import threading
+import numpy as np
+import structlog
+from cachetools import LRUCache
+
+from app.text_processing import text_hashes
+from app.metrics import record_cache, stage_timer
+from app.model_loader import MODEL_CACHE_DIR, RECOMMENDER_SENTIMENT_MODEL, load_model_and_tokenizer
+
+logger = structlog.get_logger()
+
+# Thư mục chứa mô hình ONNX đã export bằng `python -m app.sentiment_export`
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join(MODEL_CACHE_DIR, "onnx"))
+MAX_LENGTH = 512
+# Cache kết quả (bỏ qua cả tokenize lẫn suy luận) và cache token (tùy chọn, 0 = tắt)
+RESULT_CACHE_SIZE = int(os.getenv("SENTIMENT_RESULT_CACHE_SIZE", 10000))
+TOKEN_CACHE_SIZE = int(os.getenv("SENTIMENT_TOKEN_CACHE_SIZE", 0))
+# Tăng SENTIMENT_MODEL_REVISION để đánh dấu toàn bộ điểm đã lưu là cũ và cho job nền chấm lại
+MODEL_REVISION = os.getenv("SENTIMENT_MODEL_REVISION", "1")
+
+_backends = {}
+_lock = threading.Lock()
+
+
+def stars_to_score(label: str) -> float:
+    """Chuyển nhãn '1 star'..'5 stars' của nlptown sang thang [-1, 1]."""
+    return (int(label.split()[0]) - 3) / 2.0
+
+
+def onnx_model_path(model: str, quantized: bool = False) -> str:
+    filename = "model.int8.onnx" if quantized else "model.onnx"
+    return os.path.join(ONNX_MODEL_DIR, model.replace("/", "--"), filename)
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+class SentimentBackend:
+    """Giao diện chung cho các backend suy luận cảm xúc trên CPU."""
+
+    name = "base"
+
+    def __init__(self, model: str, batch_size: int = 32, result_cache_size: int = None,
+                 token_cache_size: int = None):
+        self.model = model
+        self.batch_size = batch_size
+        self.id2label = {}
+        self.tokenizer = None
+        result_cache_size = RESULT_CACHE_SIZE if result_cache_size is None else result_cache_size
+        token_cache_size = TOKEN_CACHE_SIZE if token_cache_size is None else token_cache_size
+        self.result_cache = LRUCache(maxsize=result_cache_size) if result_cache_size > 0 else None
+        self.token_cache = LRUCache(maxsize=token_cache_size) if token_cache_size > 0 else None
+        self._cache_lock = threading.Lock()
+
+    @property
+    def model_version(self) -> str:
+        """Phiên bản lưu kèm điểm trong review_sentiments."""
+        return f"{self.model}:{self.name}:{MODEL_REVISION}"
+
+    def _logits(self, texts: list) -> np.ndarray:
+        raise NotImplementedError
+
+    def _encode(self, texts: list, return_tensors: str):
+        """Tokenize một batch; khi bật token cache thì chỉ tokenize các văn bản chưa gặp rồi pad lại."""
+        if self.token_cache is None:
+            return self.tokenizer(texts, padding=True, truncation=True, max_length=MAX_LENGTH,
+                                  return_tensors=return_tensors)
+        keys = text_hashes(texts)
+        with self._cache_lock:
+            features = {key: self.token_cache.get(key) for key in keys}
+        missing = {key: text for key, text in zip(keys, texts) if features[key] is None}
+        if missing:
+            encoded = self.tokenizer(list(missing.values()), truncation=True, max_length=MAX_LENGTH)
+            with self._cache_lock:
+                for i, key in enumerate(missing):
+                    features[key] = {name: values[i] for name, values in encoded.items()}
+                    self.token_cache[key] = features[key]
+        return self.tokenizer.pad([features[key] for key in keys], padding=True, return_tensors=return_tensors)
+
+    @stage_timer("model_inference")
+    def _predict_uncached(self, texts: list) -> list:
+        results = []
+        for start in range(0, len(texts), self.batch_size):
+            probs = _softmax(self._logits(texts[start:start + self.batch_size]))
+            results.extend(
+                {self.id2label[i]: float(p) for i, p in enumerate(row)}
+                for row in probs
+            )
+        return results
+
+    def predict(self, texts: list) -> list:
+        """Trả về xác suất theo nhãn cho từng văn bản: [{'1 star': p1, ...}, ...].
+
+        Kết quả được cache theo hash của văn bản đã chuẩn hóa, nên các bình luận chỉ khác
+        dấu câu hoặc chữ hoa dùng chung một kết quả.
+        """
+        if self.result_cache is None:
+            return self._predict_uncached(texts)
+        keys = text_hashes(texts)
+        with self._cache_lock:
+            cached = {key: self.result_cache.get(key) for key in keys}
+        missing = {}
+        for key, text in zip(keys, texts):
+            record_cache("sentiment_result", cached[key] is not None)
+            if cached[key] is None:
+                missing.setdefault(key, text)
+        if missing:
+            for key, probs in zip(missing, self._predict_uncached(list(missing.values()))):
+                cached[key] = probs
+            with self._cache_lock:
+                for key in missing:
+                    self.result_cache[key] = cached[key]
+        return [cached[key] for key in keys]
+
+    def labels(self, texts: list) -> list:
+        return [max(probs, key=probs.get) for probs in self.predict(texts)]
+
+    def star_scores(self, texts: list) -> list:
+        """Điểm cảm xúc [-1, 1] theo công thức (stars - 3) / 2 cho mô hình nlptown."""
+        return [stars_to_score(label) for label in self.labels(texts)]
+
+
+class TorchBackend(SentimentBackend):
+    """PyTorch full precision (hành vi mặc định trước đây)."""
+
+    name = "torch"
+
+    def __init__(self, model: str, **kwargs):
+        super().__init__(model, **kwargs)
+        import torch
+
+        self._torch = torch
+        self.classifier, self.tokenizer = load_model_and_tokenizer(model)
+        self.classifier.eval()
+        self.id2label = self.classifier.config.id2label
+
+    def _logits(self, texts: list) -> np.ndarray:
+        encoded = self._encode(texts, "pt")
+        with self._torch.inference_mode():
+            return self.classifier(**encoded).logits.numpy()
+
+
+class QuantizedTorchBackend(TorchBackend):
+    """PyTorch với các lớp Linear được lượng tử hóa động sang int8."""
+
+    name = "quantized"
+
+    def __init__(self, model: str, **kwargs):
+        super().__init__(model, **kwargs)
+        self.classifier = self._torch.quantization.quantize_dynamic(
+            self.classifier, {self._torch.nn.Linear}, dtype=self._torch.qint8
+        )
+
+
+class OnnxBackend(SentimentBackend):
+    """ONNX Runtime trên CPU, dùng mô hình đã export (tùy chọn bản int8)."""
+
+    name = "onnx"
+
+    def __init__(self, model: str, quantized: bool = None, **kwargs):
+        super().__init__(model, **kwargs)
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("SENTIMENT_BACKEND=onnx requires `pip install onnxruntime`") from e
+        from transformers import AutoConfig, AutoTokenizer
+
+        if quantized is None:
+            quantized = os.getenv("SENTIMENT_ONNX_QUANTIZED", "1") == "1"
+        path = onnx_model_path(model, quantized)
+        if quantized and not os.path.exists(path):
+            path = onnx_model_path(model, False)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"ONNX model not found at {path}, run `python -m app.sentiment_export` first")
+
+        model_dir = os.path.dirname(path)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.id2label = {int(k): v for k, v in AutoConfig.from_pretrained(model_dir).id2label.items()}
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = int(os.getenv("SENTIMENT_ONNX_THREADS", 0))
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.path = path
+
+    def _logits(self, texts: list) -> np.ndarray:
+        encoded = self._encode(texts, "np")
+        feeds = {k: v.astype(np.int64) for k, v in encoded.items() if k in self.input_names}
+        return self.session.run(None, feeds)[0]
+
+
+BACKENDS = {
+    TorchBackend.name: TorchBackend,
+    QuantizedTorchBackend.name: QuantizedTorchBackend,
+    OnnxBackend.name: OnnxBackend,
+}
+
+
+def create_backend(name: str, model: str = RECOMMENDER_SENTIMENT_MODEL, **kwargs) -> SentimentBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown sentiment backend {name}, expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name](model, **kwargs)
+
+
+def get_sentiment_backend(model: str = RECOMMENDER_SENTIMENT_MODEL) -> SentimentBackend:
+    """Backend dùng chung trong worker, chọn qua SENTIMENT_BACKEND (torch | quantized | onnx)."""
+    if model in _backends:
+        return _backends[model]
+    with _lock:
+        if model not in _backends:
+            name = os.getenv("SENTIMENT_BACKEND", TorchBackend.name)
+            try:
+                backend = create_backend(name, model)
+            except (ImportError, FileNotFoundError) as e:
+                logger.warning("Sentiment backend unavailable, falling back to torch", backend=name, error=str(e))
+                backend = TorchBackend(model)
+            _backends[model] = backend
+            logger.info("Initialized sentiment backend", model=model, backend=backend.name)
+    return _backends[model]
+
+
+def parity_report(reference: SentimentBackend, candidate: SentimentBackend, texts: list,
+                  score_fn=stars_to_score) -> dict:
+    """So sánh nhãn và điểm (mặc định (stars - 3) / 2) của backend mới với backend tham chiếu."""
+    ref_labels = reference.labels(texts)
+    cand_labels = candidate.labels(texts)
+    diffs = [abs(score_fn(a) - score_fn(b)) for a, b in zip(ref_labels, cand_labels)] if score_fn else []
+    mismatches = [
+        {"text": text, "reference": a, "candidate": b}
+        for text, a, b in zip(texts, ref_labels, cand_labels) if a != b
+    ]
+    return {
+        "reference": reference.name,
+        "candidate": candidate.name,
+        "count": len(texts),
+        "label_agreement": 1 - len(mismatches) / len(texts) if texts else 1.0,
+        "mean_abs_score_diff": sum(diffs) / len(diffs) if diffs else 0.0,
+        "max_abs_score_diff": max(diffs) if diffs else 0.0,
+        "mismatches": mismatches,
+    }
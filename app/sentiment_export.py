@@ -0,0 +1,116 @@
+"""Export mô hình cảm xúc sang ONNX (kèm bản int8) và kiểm tra độ khớp với backend PyTorch.
+
+    python -m app.sentiment_export --model nlptown/bert-base-multilingual-uncased-sentiment --check
+"""
+import os
+import sys
+import json
+import argparse
+import structlog
+
+from app.text_processing import preprocess_batch
+from app.model_loader import RECOMMENDER_SENTIMENT_MODEL, load_model_and_tokenizer
+from app.sentiment_backends import (
+    OnnxBackend, QuantizedTorchBackend, TorchBackend, onnx_model_path, parity_report, stars_to_score
+)
+
+logger = structlog.get_logger()
+
+# Bình luận mẫu dùng khi không lấy dữ liệu từ database
+SAMPLE_REVIEWS = [
+    "hồ xuân hương khá đẹp nhưng không có gì đặc biệt lắm",
+    "hồ đẹp nhưng nhiều người quá",
+    "tệ lắm người dân không thân thiện",
+    "hồ rất đẹp",
+    "tệ",
+    "cảnh quan tuyệt vời sẽ quay lại",
+    "giá vé hơi cao so với trải nghiệm",
+    "đồ ăn ngon nhân viên nhiệt tình",
+]
+
+
+def export_onnx(model: str, quantize: bool = True) -> str:
+    """Export mô hình sang ONNX với trục batch/sequence động, tùy chọn lượng tử hóa int8."""
+    import torch
+
+    classifier, tokenizer = load_model_and_tokenizer(model)
+    classifier.eval()
+    path = onnx_model_path(model)
+    output_dir = os.path.dirname(path)
+    os.makedirs(output_dir, exist_ok=True)
+
+    dummy = tokenizer(["xin chào"], return_tensors="pt")
+    input_names = list(dummy.keys())
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+    torch.onnx.export(
+        classifier,
+        tuple(dummy[name] for name in input_names),
+        path,
+        input_names=input_names,
+        output_names=["logits"],
+        dynamic_axes=dynamic_axes,
+        opset_version=14,
+    )
+    # Tokenizer và config đặt cạnh file ONNX để OnnxBackend không cần nạp mô hình PyTorch
+    tokenizer.save_pretrained(output_dir)
+    classifier.config.save_pretrained(output_dir)
+    logger.info("Exported ONNX model", model=model, path=path)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantized_path = onnx_model_path(model, quantized=True)
+        quantize_dynamic(path, quantized_path, weight_type=QuantType.QInt8)
+        logger.info("Quantized ONNX model", model=model, path=quantized_path)
+    return path
+
+
+def load_reviews_from_db(limit: int) -> list:
+    from app.services import get_db_connection
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT review_text FROM reviews ORDER BY id DESC LIMIT %s", (limit,))
+    reviews = preprocess_batch([row[0] for row in cursor.fetchall() if row[0]])
+    cursor.close()
+    conn.close()
+    return reviews
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=RECOMMENDER_SENTIMENT_MODEL)
+    parser.add_argument("--no-quantize", action="store_true", help="Chỉ export bản ONNX fp32")
+    parser.add_argument("--skip-export", action="store_true", help="Chỉ chạy kiểm tra độ khớp")
+    parser.add_argument("--check", action="store_true", help="So sánh nhãn với backend torch")
+    parser.add_argument("--from-db", type=int, default=0, metavar="N", help="Dùng N bình luận mới nhất trong database")
+    parser.add_argument("--min-agreement", type=float, default=0.95)
+    args = parser.parse_args(argv)
+
+    if not args.skip_export:
+        export_onnx(args.model, quantize=not args.no_quantize)
+    if not args.check:
+        return 0
+
+    texts = load_reviews_from_db(args.from_db) if args.from_db else SAMPLE_REVIEWS
+    score_fn = stars_to_score if args.model == RECOMMENDER_SENTIMENT_MODEL else None
+    reference = TorchBackend(args.model, result_cache_size=0)
+    candidates = [
+        QuantizedTorchBackend(args.model, result_cache_size=0),
+        OnnxBackend(args.model, quantized=False, result_cache_size=0),
+    ]
+    if not args.no_quantize:
+        candidates.append(OnnxBackend(args.model, quantized=True, result_cache_size=0))
+
+    ok = True
+    for candidate in candidates:
+        report = parity_report(reference, candidate, texts, score_fn=score_fn)
+        report["candidate"] = getattr(candidate, "path", candidate.name)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        ok = ok and report["label_agreement"] >= args.min_agreement
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
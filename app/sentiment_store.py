@@ -0,0 +1,222 @@
+"""Lưu kết quả cảm xúc theo từng bình luận (hash nội dung + phiên bản mô hình).
+
+Trên đường request chỉ chấm điểm bình luận mới hoặc đã sửa nội dung; khi đổi phiên bản mô hình,
+các điểm cũ vẫn được dùng cho tới khi job chấm lại chạy. Worker tự chạy job này ở luồng nền sau warm-up
+(SENTIMENT_RESCORE_ON_START=1, chỉ một worker nhờ khóa GET_LOCK của MySQL); cũng có thể chạy tay:
+
+    python -m app.sentiment_store --batch-size 200 --pause 0.5
+"""
+import os
+import sys
+import time
+import argparse
+import structlog
+
+from app.services import get_db_connection
+from app.sentiment_backends import get_sentiment_backend
+from app.text_processing import preprocess_batch, text_hash, text_hashes
+
+logger = structlog.get_logger()
+
+SENTIMENT_RESCORE_ON_START = os.getenv("SENTIMENT_RESCORE_ON_START", "1") == "1"
+# Số giây nghỉ giữa các lô khi chấm lại ở luồng nền, để nhường CPU cho request
+SENTIMENT_RESCORE_PAUSE = float(os.getenv("SENTIMENT_RESCORE_PAUSE", 0.5))
+RESCORE_LOCK_NAME = "travel_recommendation.sentiment_rescore"
+
+UPSERT_SQL = (
+    "INSERT INTO review_sentiments (review_id, destination_id, content_hash, model_version, score) "
+    "VALUES (%s, %s, %s, %s, %s) "
+    "ON DUPLICATE KEY UPDATE content_hash = VALUES(content_hash), model_version = VALUES(model_version), "
+    "score = VALUES(score)"
+)
+
+
+def save_review_sentiments(cursor, rows: list):
+    """Ghi (review_id, destination_id, content_hash, model_version, score) trong transaction của caller."""
+    if rows:
+        cursor.executemany(UPSERT_SQL, rows)
+
+
+def _score_reviews(backend, reviews: list) -> list:
+    """Chấm điểm danh sách (review_id, destination_id, review_text) và trả về các dòng để ghi."""
+    texts = [text for _, _, text in reviews]
+    scores = backend.star_scores(preprocess_batch(texts))
+    return [
+        (review_id, destination_id, content_hash, backend.model_version, score)
+        for (review_id, destination_id, _), content_hash, score in zip(reviews, text_hashes(texts), scores)
+    ]
+
+
+def score_missing_reviews(cursor, backend, destination_ids: list) -> int:
+    """Chấm điểm và ghi các bình luận của destination_ids chưa có dòng trong review_sentiments.
+
+    Đó là bình luận có từ trước migration 001 hoặc nhập bằng app.ingest mà chưa chấm; thiếu chúng thì điểm trung bình
+    của địa điểm chỉ tính trên vài bình luận mới.
+    """
+    placeholders = ", ".join(["%s"] * len(destination_ids))
+    cursor.execute(
+        "SELECT r.id, r.destination_id, r.review_text FROM reviews r "
+        "LEFT JOIN review_sentiments rs ON rs.review_id = r.id "
+        f"WHERE r.destination_id IN ({placeholders}) AND rs.review_id IS NULL",
+        destination_ids
+    )
+    missing = cursor.fetchall()
+    if missing:
+        save_review_sentiments(cursor, _score_reviews(backend, missing))
+        logger.info("Scored reviews missing sentiment", destinations=len(destination_ids), count=len(missing))
+    return len(missing)
+
+
+def update_destination_scores(cursor, destination_ids: list, model_version: str = None):
+    """Đặt sentiment_score của các địa điểm bằng điểm trung bình trong review_sentiments.
+
+    Một câu UPDATE cho mọi địa điểm, theo thứ tự id để các worker khóa dòng cùng thứ tự. Với model_version, chỉ tính
+    điểm của phiên bản đó và bỏ qua địa điểm còn bình luận chưa có điểm của phiên bản này, để job chấm lại không ghi
+    điểm trung bình của một phần bình luận hay trộn hai phiên bản.
+    """
+    destination_ids = sorted(destination_ids)
+    placeholders = ", ".join(["%s"] * len(destination_ids))
+    if model_version is not None:
+        cursor.execute(
+            "UPDATE destinations d JOIN ("
+            "SELECT r.destination_id, AVG(rs.score) AS avg_score FROM reviews r "
+            "LEFT JOIN review_sentiments rs ON rs.review_id = r.id AND rs.model_version = %s "
+            f"WHERE r.destination_id IN ({placeholders}) GROUP BY r.destination_id "
+            "HAVING COUNT(rs.review_id) = COUNT(*)"
+            ") s ON s.destination_id = d.id SET d.sentiment_score = s.avg_score",
+            [model_version] + destination_ids
+        )
+        return
+    cursor.execute(
+        "UPDATE destinations d JOIN ("
+        "SELECT destination_id, AVG(score) AS avg_score FROM review_sentiments "
+        f"WHERE destination_id IN ({placeholders}) GROUP BY destination_id"
+        ") s ON s.destination_id = d.id SET d.sentiment_score = s.avg_score",
+        destination_ids
+    )
+
+
+def get_destination_sentiment(destination_id: int) -> float:
+    """Điểm cảm xúc trung bình của một địa điểm, chỉ chấm điểm các bình luận chưa có kết quả hợp lệ."""
+    backend = get_sentiment_backend()
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT r.id, r.review_text, rs.content_hash, rs.score FROM reviews r "
+            "LEFT JOIN review_sentiments rs ON rs.review_id = r.id "
+            "WHERE r.destination_id = %s",
+            (destination_id,)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            cursor.close()
+            return 0.0
+
+        scores = []
+        pending = []
+        for review_id, review_text, content_hash, score in rows:
+            # Điểm của phiên bản mô hình cũ vẫn dùng được; job nền sẽ chấm lại
+            if score is not None and content_hash == text_hash(review_text):
+                scores.append(score)
+            else:
+                pending.append((review_id, destination_id, review_text))
+
+        if pending:
+            new_rows = _score_reviews(backend, pending)
+            save_review_sentiments(cursor, new_rows)
+            conn.commit()
+            scores.extend(row[4] for row in new_rows)
+        cursor.close()
+        logger.info("Calculated destination sentiment", destination_id=destination_id,
+                    reviews=len(rows), rescored=len(pending))
+        return sum(scores) / len(scores)
+    finally:
+        conn.close()
+
+
+def rescore_stale(batch_size: int = 200, pause: float = 0.0, limit: int = None) -> int:
+    """Chấm lại theo lô các bình luận có phiên bản mô hình khác phiên bản hiện tại.
+
+    sentiment_score của một địa điểm chỉ được cập nhật khi mọi bình luận của nó đã có điểm của phiên bản hiện tại.
+    """
+    backend = get_sentiment_backend()
+    total = 0
+    last_id = 0
+    while limit is None or total < limit:
+        size = batch_size if limit is None else min(batch_size, limit - total)
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT r.id, r.destination_id, r.review_text FROM reviews r "
+            "LEFT JOIN review_sentiments rs ON rs.review_id = r.id "
+            "WHERE r.id > %s AND (rs.review_id IS NULL OR rs.model_version <> %s) "
+            "ORDER BY r.id LIMIT %s",
+            (last_id, backend.model_version, size)
+        )
+        reviews = cursor.fetchall()
+        if not reviews:
+            cursor.close()
+            conn.close()
+            break
+
+        rows = _score_reviews(backend, reviews)
+        save_review_sentiments(cursor, rows)
+        # Bình luận của một địa điểm có thể trải qua nhiều lô: điểm được cập nhật ở lô chấm xong bình luận cuối cùng
+        update_destination_scores(cursor, {destination_id for _, destination_id, _ in reviews},
+                                  backend.model_version)
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+        total += len(reviews)
+        last_id = reviews[-1][0]
+        logger.info("Rescored review batch", count=len(reviews), total=total, model_version=backend.model_version)
+        if pause:
+            time.sleep(pause)
+    return total
+
+
+def rescore_if_stale() -> int:
+    """Chấm lại bình luận của phiên bản mô hình cũ nếu có, trả về số bình luận đã chấm lại.
+
+    Giữ khóa GET_LOCK trên một kết nối riêng suốt lượt chạy nên các worker khác (kể cả ở container khác) bỏ qua;
+    khóa tự nhả khi kết nối đóng, kể cả khi worker bị kill.
+    """
+    backend = get_sentiment_backend()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM reviews r LEFT JOIN review_sentiments rs ON rs.review_id = r.id "
+            "WHERE rs.review_id IS NULL OR rs.model_version <> %s)",
+            (backend.model_version,)
+        )
+        if not cursor.fetchone()[0]:
+            return 0
+        cursor.execute("SELECT GET_LOCK(%s, 0)", (RESCORE_LOCK_NAME,))
+        if cursor.fetchone()[0] != 1:
+            logger.info("Sentiment rescoring already running elsewhere", model_version=backend.model_version)
+            return 0
+        logger.info("Rescoring reviews for new sentiment model", model_version=backend.model_version)
+        total = rescore_stale(pause=SENTIMENT_RESCORE_PAUSE)
+        logger.info("Sentiment rescoring completed", model_version=backend.model_version, total=total)
+        return total
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--pause", type=float, default=0.0, help="Số giây nghỉ giữa các lô")
+    parser.add_argument("--limit", type=int, default=None, help="Số bình luận tối đa cho lần chạy này")
+    args = parser.parse_args(argv)
+    total = rescore_stale(args.batch_size, args.pause, args.limit)
+    print(f"Rescored {total} reviews")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,9 +3,12 @@ import os
 import requests
 import mysql.connector
 from cachetools import TTLCache
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from requests.exceptions import HTTPError
 import structlog
+from app.ors_client import ors_request, Priority, ORSRateLimitError
+from app.metrics import DB_CONNECTIONS, record_cache, stage_timer
+from app.utils import log_every_n
+from app.invalidation import on_city_invalidated
 
 structlog.configure(
     processors=[
@@ -20,23 +23,60 @@ structlog.configure(
 )
 
 logger = structlog.get_logger()
+WEATHER_BASE_URL = os.getenv("WEATHER_BASE_URL", "http://api.openweathermap.org")
 travel_time_cache = TTLCache(maxsize=1000, ttl=3600)
+UPSERT_TRAVEL_TIME_SQL = (
+    "INSERT INTO travel_times (city_id, start_location, end_location, duration_seconds, distance_meters, updated_at) "
+    "VALUES (%s, %s, %s, %s, %s, NOW()) "
+    "ON DUPLICATE KEY UPDATE duration_seconds = VALUES(duration_seconds), "
+    "distance_meters = VALUES(distance_meters), updated_at = NOW()"
+)
+# Danh bạ thành phố (tên -> id), ít thay đổi nên giữ suốt vòng đời worker
+city_registry = {}
+
+@on_city_invalidated
+def clear_travel_times(city_id: int):
+    """Xóa các thời gian di chuyển đã cache của một thành phố."""
+    prefix = f"{city_id}:"
+    for key in [key for key in list(travel_time_cache) if key.startswith(prefix)]:
+        travel_time_cache.pop(key, None)
 
 def get_db_connection():
     try:
-        conn = mysql.connector.connect(
-            host=os.getenv("DB_HOST", "db"),
-            user=os.getenv("DB_USER", "root"),
-            password=os.getenv("DB_PASSWORD"),
-            database=os.getenv("DB_NAME", "travel_recommendation")
-        )
-        logger.info("Database connection established")
+        with stage_timer("db_connect"):
+            conn = mysql.connector.connect(
+                host=os.getenv("DB_HOST", "db"),
+                user=os.getenv("DB_USER", "root"),
+                password=os.getenv("DB_PASSWORD"),
+                database=os.getenv("DB_NAME", "travel_recommendation")
+            )
+        DB_CONNECTIONS.inc()
+        if log_every_n("db_connect", 100):
+            logger.info("Database connection established")
         return conn
     except mysql.connector.Error as e:
         logger.error("Database connection failed", error=str(e))
         raise
 
+def load_city_registry() -> dict:
+    """Nạp toàn bộ bảng cities vào city_registry."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, name FROM cities")
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    city_registry.update({name: city_id for city_id, name in rows})
+    logger.info("Loaded city registry", count=len(rows))
+    return dict(city_registry)
+
+def format_duration(seconds: float) -> str:
+    """Chuỗi hiển thị thời gian di chuyển, dạng "12.34 mins"."""
+    return f"{seconds / 60:.2f} mins"
+
 def get_city_id(city: str) -> int:
+    if city in city_registry:
+        return city_registry[city]
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -46,6 +86,7 @@ def get_city_id(city: str) -> int:
         conn.close()
         if result:
             logger.info("Fetched city_id", city=city, city_id=result[0])
+            city_registry[city] = result[0]
             return result[0]
         logger.error("City not found", city=city)
         raise ValueError(f"City {city} not found in database")
@@ -53,7 +94,7 @@ def get_city_id(city: str) -> int:
         logger.error("Error fetching city_id", error=str(e))
         raise
 
-def get_coordinates(location: str, city: str) -> list:
+def get_coordinates(location: str, city: str, priority: Priority = Priority.USER) -> list:
     city_id = get_city_id(city)
     try:
         conn = get_db_connection()
@@ -74,7 +115,7 @@ def get_coordinates(location: str, city: str) -> list:
     except Exception as e:
         logger.error("Error querying coordinates", error=str(e))
 
-    coords = get_ors_coordinates(location, city)
+    coords = get_ors_coordinates(location, city, priority=priority)
     if coords:
         lat, lon = coords
         try:
@@ -93,19 +134,19 @@ def get_coordinates(location: str, city: str) -> list:
         return [lon, lat]
     return None
 
-def get_ors_coordinates(location: str, city: str, country: str = "Vietnam") -> tuple:
+def get_ors_coordinates(location: str, city: str, country: str = "Vietnam",
+                        priority: Priority = Priority.USER) -> tuple:
     api_key = os.getenv("ORS_API_KEY")
     if not api_key:
         logger.error("ORS_API_KEY not set")
         return None
-    url = "https://api.openrouteservice.org/geocode/autocomplete"
     params = {
         "api_key": api_key,
         "text": f"{location}, {city}, {country}",
         "boundary.country": "VN"
     }
     try:
-        response = requests.get(url, params=params)
+        response = ors_request("geocode", "GET", "/geocode/autocomplete", priority=priority, params=params)
         response.raise_for_status()
         data = response.json()
         if data["features"]:
@@ -117,45 +158,44 @@ def get_ors_coordinates(location: str, city: str, country: str = "Vietnam") -> t
         logger.error("Error fetching coordinates", location=location, error=str(e))
         return None
 
-@retry(
-    stop=stop_after_attempt(8),
-    wait=wait_exponential(multiplier=2, min=4, max=120),
-    retry=retry_if_exception_type((HTTPError, requests.exceptions.ConnectionError)),
-    reraise=True
-)
-def get_travel_time(start_location: str, end_location: str, city: str) -> dict:
+def get_travel_time(start_location: str, end_location: str, city: str,
+                    priority: Priority = Priority.USER) -> dict:
+    """Thời gian di chuyển {"duration_seconds": ..., "distance_meters": ...}, hoặc {"error": ...} nếu không lấy được."""
     city_id = get_city_id(city)
     cache_key = f"{city_id}:{start_location}:{end_location}"
     
-    if cache_key in travel_time_cache:
-        logger.info("Cache hit for travel time", cache_key=cache_key)
-        return travel_time_cache[cache_key]
+    cached = travel_time_cache.get(cache_key)
+    record_cache("travel_time", cached is not None, len(travel_time_cache))
+    if cached is not None:
+        if log_every_n("travel_time_cache_hit", 100):
+            logger.info("Cache hit for travel time", cache_key=cache_key)
+        return cached
 
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute(
-            "SELECT duration, updated_at FROM travel_times WHERE city_id = %s AND start_location = %s AND end_location = %s",
+            "SELECT duration_seconds, distance_meters FROM travel_times "
+            "WHERE city_id = %s AND start_location = %s AND end_location = %s",
             (city_id, start_location, end_location)
         )
         result = cursor.fetchone()
-        if result and result[1]:
-            duration, updated_at = result
-            travel_time_cache[cache_key] = {"duration": duration}
-            logger.info("Database hit for travel time", cache_key=cache_key)
-            cursor.close()
-            conn.close()
-            return {"duration": duration}
         cursor.close()
         conn.close()
+        if result:
+            travel_time = {"duration_seconds": result[0], "distance_meters": result[1]}
+            travel_time_cache[cache_key] = travel_time
+            if log_every_n("travel_time_db_hit", 100):
+                logger.info("Database hit for travel time", cache_key=cache_key)
+            return travel_time
     except Exception as e:
         logger.error("Error querying travel_times", error=str(e))
 
-    start_coords = get_coordinates(start_location, city)
-    end_coords = get_coordinates(end_location, city)
+    start_coords = get_coordinates(start_location, city, priority=priority)
+    end_coords = get_coordinates(end_location, city, priority=priority)
     if not start_coords or not end_coords:
         logger.error("Invalid coordinates", start_location=start_location, end_location=end_location)
-        return {"duration": "N/A"}
+        return {"error": "Travel time unavailable: invalid coordinates"}
 
     api_key = os.getenv("ORS_API_KEY")
     if not api_key:
@@ -165,24 +205,23 @@ def get_travel_time(start_location: str, end_location: str, city: str) -> dict:
     headers = {"Authorization": api_key}
     body = {"coordinates": [start_coords, end_coords]}
     try:
-        response = requests.post(
-            "https://api.openrouteservice.org/v2/directions/driving-car/geojson",
+        response = ors_request(
+            "directions", "POST", "/v2/directions/driving-car/geojson",
+            priority=priority,
             json=body,
             headers=headers,
         )
         response.raise_for_status()
         data = response.json()
-        duration = data["features"][0]["properties"]["summary"]["duration"]
-        result = {"duration": f"{duration / 60:.2f} mins"}
+        summary = data["features"][0]["properties"]["summary"]
+        result = {"duration_seconds": float(summary["duration"]), "distance_meters": float(summary.get("distance", 0))}
 
         try:
             conn = get_db_connection()
             cursor = conn.cursor()
             cursor.execute(
-                "INSERT INTO travel_times (city_id, start_location, end_location, duration, updated_at) "
-                "VALUES (%s, %s, %s, %s, NOW()) "
-                "ON DUPLICATE KEY UPDATE duration = %s, updated_at = NOW()",
-                (city_id, start_location, end_location, result["duration"], result["duration"])
+                UPSERT_TRAVEL_TIME_SQL,
+                (city_id, start_location, end_location, result["duration_seconds"], result["distance_meters"])
             )
             conn.commit()
             cursor.close()
@@ -192,12 +231,13 @@ def get_travel_time(start_location: str, end_location: str, city: str) -> dict:
 
         travel_time_cache[cache_key] = result
         return result
+    except ORSRateLimitError as e:
+        logger.warning("Travel time rate limited", error=str(e), retry_after=e.retry_after)
+        return {"error": str(e), "retry_after": e.retry_after}
     except HTTPError as e:
-        if response.status_code in (429, 404):
+        if response.status_code == 404:
             logger.error("HTTP error in get_travel_time", error=str(e), status_code=response.status_code)
-            if response.status_code == 429:
-                raise
-            return {"duration": "N/A"}
+            return {"error": "Travel time unavailable: no route found"}
         return {"error": f"Cannot calculate travel time: {e}"}
     except Exception as e:
         logger.error("Error in get_travel_time", error=str(e))
@@ -209,8 +249,9 @@ def get_current_weather(city: str) -> dict:
         logger.error("WEATHER_API_KEY not set")
         return {"error": "Missing WEATHER_API_KEY"}
     try:
-        url = f"http://api.openweathermap.org/data/2.5/weather?q={city},VN&appid={api_key}&units=metric"
-        response = requests.get(url)
+        url = f"{WEATHER_BASE_URL}/data/2.5/weather?q={city},VN&appid={api_key}&units=metric"
+        with stage_timer("weather"):
+            response = requests.get(url)
         response.raise_for_status()
         data = response.json()
         return {
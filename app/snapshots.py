@@ -0,0 +1,184 @@
+import os
+import time
+import itertools
+import threading
+
+import structlog
+
+from app.metrics import record_cache
+from app.sparse_qtable import TopKQTable
+
+logger = structlog.get_logger()
+
+# Snapshot cũ hơn SNAPSHOT_TTL giây vẫn được dùng trong lúc bản mới được nạp ở luồng nền
+SNAPSHOT_TTL = float(os.getenv("SNAPSHOT_TTL", 600))
+
+# Số địa điểm tối đa để giữ ma trận thời gian di chuyển N×N (giây và mét, float32) trong snapshot
+SNAPSHOT_MATRIX_MAX = int(os.getenv("SNAPSHOT_MATRIX_MAX", 2000))
+
+_versions = itertools.count(1)
+
+
+def _freeze(q_table):
+    """Bản chỉ đọc của Q-table; ai cần sửa phải copy() trước (copy-on-write)."""
+    if q_table is None:
+        return None
+    q_table = q_table.copy()
+    if isinstance(q_table, TopKQTable):
+        q_table.successors.setflags(write=False)
+        q_table.values.setflags(write=False)
+    else:
+        q_table.setflags(write=False)
+    return q_table
+
+
+class CitySnapshot:
+    """Trạng thái bất biến của một thành phố tại một phiên bản.
+
+    Gồm danh sách địa điểm (theo id), danh mục dạng cột, Q-table và ma trận thời gian di chuyển đã biết (None với
+    thành phố quá SNAPSHOT_MATRIX_MAX địa điểm), luôn khớp chỉ số với nhau. Request giữ một snapshot suốt vòng đời
+    của nó; cập nhật tạo snapshot mới.
+    """
+
+    def __init__(self, city: str, city_id: int, destinations: list, catalogue, q_table, travel_matrix=None,
+                 version: int = None):
+        self.city = city
+        self.city_id = city_id
+        self.version = version if version is not None else next(_versions)
+        self.destinations = tuple(destinations)
+        self.destination_ids = tuple(d["id"] for d in destinations)
+        self.catalogue = catalogue
+        self.q_table = _freeze(q_table)
+        self.travel_matrix = travel_matrix
+        self.created_at = time.monotonic()
+
+    @property
+    def n_states(self) -> int:
+        return len(self.destinations)
+
+    def with_q_table(self, q_table) -> "CitySnapshot":
+        """Snapshot mới cùng danh sách địa điểm, khác Q-table (giữ nguyên mốc thời gian nạp từ database)."""
+        snapshot = CitySnapshot(self.city, self.city_id, self.destinations, self.catalogue, q_table,
+                                self.travel_matrix)
+        snapshot.created_at = self.created_at
+        return snapshot
+
+    def travel_time(self, start: int, end: int) -> dict:
+        """Thời gian di chuyển đã biết giữa hai chỉ số địa điểm, None nếu chưa có trong snapshot."""
+        if self.travel_matrix is None:
+            return None
+        return self.travel_matrix.lookup(start, end)
+
+
+class SnapshotStore:
+    """Snapshot hiện hành của mỗi thành phố, thay bằng phép gán tham chiếu nguyên tử.
+
+    Đọc không cần khóa. Lần nạp đầu tiên của một thành phố và snapshot bị đánh dấu (dữ liệu trong database đã
+    đổi, ví dụ sau /train ở worker khác) phải chờ nạp lại; snapshot chỉ quá SNAPSHOT_TTL được nạp lại ở luồng nền
+    trong khi request vẫn dùng bản cũ.
+    """
+
+    def __init__(self, loader, ttl: float = SNAPSHOT_TTL):
+        self.loader = loader
+        self.ttl = ttl
+        self._snapshots = {}
+        # Số lần đánh dấu của mỗi thành phố và số lần đánh dấu đã có khi bắt đầu lượt nạp cho snapshot hiện hành
+        self._marks = {}
+        self._loaded_marks = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._city_locks = {}
+
+    def _city_lock(self, city: str) -> threading.Lock:
+        with self._lock:
+            return self._city_locks.setdefault(city, threading.Lock())
+
+    def get(self, city: str) -> CitySnapshot:
+        snapshot = self._snapshots.get(city)
+        record_cache("city_snapshot", snapshot is not None, len(self._snapshots))
+        if snapshot is None:
+            # Nhiều request cùng lúc cho thành phố chưa nạp chỉ tạo một snapshot
+            with self._city_lock(city):
+                snapshot = self._snapshots.get(city)
+                if snapshot is None:
+                    snapshot = self._load(city)
+            return snapshot
+        if self.is_stale(city):
+            with self._city_lock(city):
+                # Luồng khác có thể vừa nạp xong trong lúc chờ khóa
+                if self.is_stale(city):
+                    try:
+                        self._load(city)
+                    except Exception as e:
+                        # Database lỗi: dùng tạm bản cũ, request sau thử nạp lại
+                        logger.error("City snapshot reload failed", city=city, error=str(e))
+                return self._snapshots[city]
+        if time.monotonic() - snapshot.created_at > self.ttl:
+            self.refresh(city)
+        return snapshot
+
+    def is_stale(self, city: str) -> bool:
+        return self._marks.get(city, 0) != self._loaded_marks.get(city, 0)
+
+    def _mark_stale(self, city: str):
+        with self._lock:
+            self._marks[city] = self._marks.get(city, 0) + 1
+
+    def _load(self, city: str) -> CitySnapshot:
+        started = time.monotonic()
+        # Ghi nhận trước khi đọc database để lần đánh dấu xảy ra trong lúc nạp vẫn còn hiệu lực
+        mark = self._marks.get(city, 0)
+        snapshot = self.loader(city)
+        self._snapshots[city] = snapshot
+        self._loaded_marks[city] = mark
+        logger.info("Published city snapshot", city=city, version=snapshot.version,
+                    destinations=snapshot.n_states, seconds=round(time.monotonic() - started, 3))
+        return snapshot
+
+    def refresh(self, city: str):
+        """Nạp lại snapshot ở luồng nền (bỏ qua nếu đang có lượt nạp cho thành phố này)."""
+        with self._lock:
+            if city in self._refreshing:
+                return
+            self._refreshing.add(city)
+
+        def run():
+            try:
+                with self._city_lock(city):
+                    self._load(city)
+            except Exception as e:
+                logger.error("City snapshot refresh failed", city=city, error=str(e))
+            finally:
+                with self._lock:
+                    self._refreshing.discard(city)
+
+        threading.Thread(target=run, name=f"snapshot-{city}", daemon=True).start()
+
+    def invalidate(self, city_id: int):
+        """Đánh dấu snapshot của thành phố là cũ; request kế tiếp sẽ kích hoạt nạp lại."""
+        for city, snapshot in list(self._snapshots.items()):
+            if snapshot.city_id == city_id:
+                self._mark_stale(city)
+
+    def publish_q_table(self, base: CitySnapshot, q_table) -> bool:
+        """Công bố Q-table vừa huấn luyện trên snapshot base.
+
+        Nếu danh sách địa điểm đã đổi kể từ base thì Q-table không còn khớp chỉ số: nạp lại từ database.
+        """
+        with self._city_lock(base.city):
+            current = self._snapshots.get(base.city)
+            if current is not None and current.destination_ids != base.destination_ids:
+                self._mark_stale(base.city)
+                published = False
+            else:
+                snapshot = (current or base).with_q_table(q_table)
+                self._snapshots[base.city] = snapshot
+                published = True
+        if published:
+            logger.info("Published city snapshot", city=base.city, version=snapshot.version, reason="q_table")
+        else:
+            self.refresh(base.city)
+        return published
+
+    def __contains__(self, city: str) -> bool:
+        return city in self._snapshots
@@ -0,0 +1,128 @@
+import numpy as np
+
+from app.utils import haversine_km
+
+
+def _fill_missing(values: np.ndarray) -> np.ndarray:
+    """Địa điểm chưa có tọa độ được đặt tại tâm các điểm còn lại."""
+    if np.isnan(values).all():
+        return np.zeros_like(values)
+    return np.where(np.isnan(values), np.nanmean(values), values)
+
+
+class TopKQTable:
+    """Q-table thưa: mỗi trạng thái chỉ giữ k điểm kế tiếp (gần nhất hoặc giá trị cao nhất).
+
+    Lưu dưới dạng hai mảng N×k (successors, values) nên bộ nhớ và thời gian nạp tỷ lệ với N·k thay vì N².
+    """
+
+    FORMAT = "topk"
+
+    def __init__(self, successors: np.ndarray, values: np.ndarray):
+        self.successors = np.ascontiguousarray(successors, dtype=np.int32)
+        self.values = np.ascontiguousarray(values, dtype=np.float32)
+        self.n_states, self.k = self.successors.shape
+
+    @staticmethod
+    def _nearest_successors(latitude: np.ndarray, longitude: np.ndarray, k: int, states: np.ndarray,
+                            chunk: int = 512) -> np.ndarray:
+        """k địa điểm gần nhất (tăng dần theo khoảng cách) của từng trạng thái trong states."""
+        n = len(latitude)
+        lat, lon = _fill_missing(latitude), _fill_missing(longitude)
+        successors = np.empty((len(states), k), dtype=np.int32)
+        for start in range(0, len(states), chunk):
+            rows = states[start:start + chunk]
+            distances = haversine_km(lat[rows, None], lon[rows, None], lat[None, :], lon[None, :])
+            if n > 1:
+                distances[np.arange(len(rows)), rows] = np.inf
+            nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            order = np.take_along_axis(distances, nearest, axis=1).argsort(axis=1, kind="stable")
+            successors[start:start + len(rows)] = np.take_along_axis(nearest, order, axis=1)
+        return successors
+
+    @classmethod
+    def nearest(cls, latitude: np.ndarray, longitude: np.ndarray, k: int, chunk: int = 512) -> "TopKQTable":
+        """Khởi tạo với k địa điểm gần nhất của mỗi trạng thái (giá trị Q = 0)."""
+        n = len(latitude)
+        # Không tính chính nó là điểm kế tiếp (trừ khi thành phố chỉ có một địa điểm)
+        k = max(1, min(k, n - 1))
+        successors = cls._nearest_successors(latitude, longitude, k, np.arange(n), chunk)
+        return cls(successors, np.zeros((n, k), dtype=np.float32))
+
+    def extend(self, latitude: np.ndarray, longitude: np.ndarray) -> "TopKQTable":
+        """Thêm các trạng thái mới ở cuối (len(latitude) > n_states) với k địa điểm gần nhất, giá trị Q = 0.
+
+        Các hàng đã huấn luyện giữ nguyên; địa điểm mới trở thành successor của chúng qua update().
+        """
+        n = len(latitude)
+        if n <= self.n_states:
+            return self.copy()
+        successors = self._nearest_successors(latitude, longitude, self.k, np.arange(self.n_states, n))
+        return TopKQTable(
+            np.vstack([self.successors, successors]),
+            np.vstack([self.values, np.zeros(successors.shape, dtype=np.float32)]),
+        )
+
+    @classmethod
+    def from_dense(cls, q_table: np.ndarray, k: int) -> "TopKQTable":
+        """Giữ lại k giá trị lớn nhất của mỗi hàng từ Q-table dày."""
+        k = min(k, q_table.shape[1])
+        successors = np.argpartition(-q_table, k - 1, axis=1)[:, :k]
+        return cls(successors, np.take_along_axis(q_table, successors, axis=1))
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TopKQTable":
+        return cls(np.array(data["successors"], dtype=np.int32), np.array(data["values"], dtype=np.float32))
+
+    def to_dict(self) -> dict:
+        return {
+            "format": self.FORMAT,
+            "k": self.k,
+            "successors": self.successors.tolist(),
+            "values": np.round(self.values.astype(np.float64), 6).tolist(),
+        }
+
+    def copy(self) -> "TopKQTable":
+        return TopKQTable(self.successors.copy(), self.values.copy())
+
+    @property
+    def nbytes(self) -> int:
+        return self.successors.nbytes + self.values.nbytes
+
+    def is_trained(self) -> bool:
+        return bool(self.values.any())
+
+    def max_value(self, state: int) -> float:
+        return float(self.values[state].max())
+
+    def best_successor(self, state: int) -> int:
+        return int(self.successors[state, self.values[state].argmax()])
+
+    def random_successor(self, state: int) -> int:
+        return int(self.successors[state, np.random.randint(self.k)])
+
+    def update(self, state: int, action: int, reward: float, alpha: float, gamma: float):
+        """Cập nhật Q-learning cho (state, action).
+
+        Nếu action chưa nằm trong k successor của state, giá trị mới thay vào ô có giá trị nhỏ nhất
+        khi lớn hơn nó, để hàng luôn giữ các chuyển tiếp có giá trị cao nhất.
+        """
+        target = reward + gamma * self.max_value(action)
+        slots = np.flatnonzero(self.successors[state] == action)
+        if slots.size:
+            slot = slots[0]
+            self.values[state, slot] += alpha * (target - self.values[state, slot])
+            return
+        value = alpha * target
+        slot = int(self.values[state].argmin())
+        if value > self.values[state, slot]:
+            self.successors[state, slot] = action
+            self.values[state, slot] = value
+
+    def best_next(self, state: int, mask: np.ndarray) -> int:
+        """Successor có giá trị Q lớn nhất trong số còn nằm trong mask, -1 nếu không còn."""
+        successors = self.successors[state]
+        available = mask[successors]
+        if not available.any():
+            return -1
+        return int(successors[np.where(available, self.values[state], -np.inf).argmax()])
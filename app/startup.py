@@ -0,0 +1,74 @@
+import os
+import threading
+from contextlib import asynccontextmanager
+import structlog
+
+from app.services import load_city_registry
+from app.sentiment_backends import get_sentiment_backend
+from app.sentiment_store import SENTIMENT_RESCORE_ON_START, rescore_if_stale
+from app.review_queue import review_queue
+from app.metrics import mark_process_dead
+
+logger = structlog.get_logger()
+
+# Trạng thái khởi động của worker, dùng cho endpoint /ready
+readiness = {
+    "ready": False,
+    "model": False,
+    "cities": False,
+    "q_tables": False,
+    "travel_times": False,
+    "error": None,
+}
+
+
+def rescore_sentiments():
+    """Chấm lại ở luồng nền các điểm cảm xúc lưu với phiên bản mô hình cũ (sau khi đổi mô hình hoặc revision)."""
+    try:
+        rescore_if_stale()
+    except Exception as e:
+        logger.error("Background sentiment rescoring failed", error=str(e))
+
+
+def warm_up():
+    """Nạp mô hình, danh bạ thành phố và snapshot (Q-table, thời gian di chuyển) của từng thành phố cho worker."""
+    try:
+        if os.getenv("WARMUP_SENTIMENT_MODEL", "1") == "1":
+            get_sentiment_backend()
+        readiness["model"] = True
+
+        cities = load_city_registry()
+        readiness["cities"] = True
+
+        # Import tại đây để tránh vòng lặp import app.routes <-> app.startup
+        from app.routes import city_snapshots
+        # Snapshot gồm cả Q-table và các thời gian di chuyển đã lưu của thành phố
+        for city, city_id in cities.items():
+            try:
+                city_snapshots.get(city)
+            except Exception as e:
+                logger.warning("Skipped city snapshot warm-up", city=city, error=str(e))
+        readiness["q_tables"] = True
+        readiness["travel_times"] = True
+
+        readiness["ready"] = True
+        logger.info("Worker warm-up completed", cities=len(cities))
+        if SENTIMENT_RESCORE_ON_START:
+            threading.Thread(target=rescore_sentiments, name="sentiment-rescore", daemon=True).start()
+    except Exception as e:
+        readiness["error"] = str(e)
+        logger.error("Worker warm-up failed", error=str(e), exc_info=True)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Chạy warm-up ở luồng nền để worker nhận /health ngay, còn /ready chỉ báo sẵn sàng khi đã nóng.
+
+    Luồng ghi bình luận chạy suốt vòng đời worker và ghi nốt hàng đợi khi tắt.
+    """
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    review_queue.start()
+    yield
+    review_queue.stop()
+    mark_process_dead()
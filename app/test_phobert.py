@@ -1,14 +1,6 @@
 
 from transformers import pipeline
-import unicodedata
-import re
-
-def preprocess_vietnamese_text(text: str) -> str:
-      """Tiền xử lý văn bản tiếng Việt: chuẩn hóa dấu và loại bỏ ký tự đặc biệt."""
-      text = unicodedata.normalize('NFC', text)
-      text = text.lower()
-      text = re.sub(r'[^\w\s]', '', text)
-      return text
+from app.text_processing import preprocess_batch
 
   # Khởi tạo mô hình
 sentiment_analyzer = pipeline(
@@ -27,7 +19,7 @@ reviews = [
   ]
 
   # Tiền xử lý và phân tích
-processed_reviews = [preprocess_vietnamese_text(review) for review in reviews]
+processed_reviews = preprocess_batch(reviews)
 results = sentiment_analyzer(processed_reviews)
 for review, processed, result in zip(reviews, processed_reviews, results):
       score = int(result["label"].split()[0])
@@ -0,0 +1,36 @@
+import re
+import hashlib
+import unicodedata
+from functools import lru_cache
+
+# Biên dịch sẵn các pattern dùng cho mỗi bình luận
+_NON_WORD = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=10000)
+def preprocess_vietnamese_text(text: str) -> str:
+    """Tiền xử lý văn bản tiếng Việt: chuẩn hóa dấu và loại bỏ ký tự đặc biệt."""
+    # Chuẩn hóa Unicode (NFC)
+    text = unicodedata.normalize("NFC", text)
+    # Chuyển thành chữ thường
+    text = text.lower()
+    # Loại bỏ ký tự đặc biệt, giữ chữ và số
+    text = _NON_WORD.sub("", text)
+    # Gộp khoảng trắng thừa để các bình luận gần giống nhau có cùng dạng chuẩn
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def preprocess_batch(texts: list) -> list:
+    """Tiền xử lý một danh sách bình luận."""
+    return [preprocess_vietnamese_text(text) for text in texts]
+
+
+def text_hash(text: str) -> str:
+    """Hash của dạng chuẩn hóa, dùng làm khóa cache cho kết quả và token."""
+    return hashlib.sha1(preprocess_vietnamese_text(text).encode("utf-8")).hexdigest()
+
+
+def text_hashes(texts: list) -> list:
+    """text_hash của từng bình luận trong một lô."""
+    return [text_hash(text) for text in texts]
@@ -0,0 +1,217 @@
+"""Ma trận thời gian di chuyển của thành phố và file .npz để chép sang worker hoặc môi trường khác.
+
+    python -m app.travel_matrix export "Da Lat" da_lat.npz
+    python -m app.travel_matrix import da_lat.npz
+    python -m app.travel_matrix import da_lat.npz --city "Da Lat Staging" --dry-run
+
+File lưu các cặp đã biết ở dạng thưa (tên địa điểm, chỉ số điểm đầu/cuối int32, giây và mét float32, nén zip)
+nên nhỏ kể cả với thành phố lớn. Nhập file ghi vào travel_times theo lô rồi báo các worker nạp lại snapshot,
+không cần gọi ORS.
+"""
+import os
+import sys
+import json
+import argparse
+
+import numpy as np
+import structlog
+
+from app.services import get_db_connection, get_city_id, UPSERT_TRAVEL_TIME_SQL
+from app.invalidation import invalidate_city
+
+logger = structlog.get_logger()
+
+FILE_VERSION = 1
+# Số cặp mỗi transaction khi nhập file
+IMPORT_BATCH = int(os.getenv("TRAVEL_MATRIX_IMPORT_BATCH", 5000))
+
+
+def _index(names: list, locations) -> np.ndarray:
+    """Chỉ số của từng tên trong names, -1 nếu không có."""
+    positions = {name: i for i, name in enumerate(names)}
+    return np.fromiter((positions.get(location, -1) for location in locations), dtype=np.int64, count=len(locations))
+
+
+class TravelMatrix:
+    """Thời gian (giây) và quãng đường (mét) giữa mọi cặp địa điểm theo chỉ số trong names, NaN nếu chưa biết.
+
+    Hai ma trận N×N float32 chỉ đọc, dùng chung giữa các request qua snapshot của thành phố.
+    """
+
+    def __init__(self, names: list, seconds: np.ndarray, meters: np.ndarray):
+        self.names = tuple(names)
+        self.seconds = seconds
+        self.meters = meters
+        self.seconds.setflags(write=False)
+        self.meters.setflags(write=False)
+
+    @classmethod
+    def from_pairs(cls, names: list, start_locations, end_locations, seconds, meters) -> "TravelMatrix":
+        """Dựng ma trận từ các cặp (tên điểm đầu, tên điểm cuối); cặp có tên không thuộc names bị bỏ qua."""
+        n = len(names)
+        matrix_seconds = np.full((n, n), np.nan, dtype=np.float32)
+        matrix_meters = np.full((n, n), np.nan, dtype=np.float32)
+        rows, columns = _index(names, start_locations), _index(names, end_locations)
+        known = (rows >= 0) & (columns >= 0)
+        rows, columns = rows[known], columns[known]
+        matrix_seconds[rows, columns] = np.asarray(seconds, dtype=np.float32)[known]
+        matrix_meters[rows, columns] = np.asarray(meters, dtype=np.float32)[known]
+        return cls(names, matrix_seconds, matrix_meters)
+
+    @property
+    def n(self) -> int:
+        return len(self.names)
+
+    @property
+    def nbytes(self) -> int:
+        return self.seconds.nbytes + self.meters.nbytes
+
+    def minutes(self) -> np.ndarray:
+        """Ma trận phút (bản mới) cho RewardEngine."""
+        return self.seconds / 60
+
+    def lookup(self, start: int, end: int) -> dict:
+        """Thời gian di chuyển giữa hai chỉ số, cùng dạng với get_travel_time; None nếu chưa biết."""
+        seconds = self.seconds[start, end]
+        if np.isnan(seconds):
+            return None
+        meters = self.meters[start, end]
+        return {"duration_seconds": float(seconds), "distance_meters": None if np.isnan(meters) else float(meters)}
+
+
+def fetch_pairs(city_id: int) -> tuple:
+    """Mọi cặp đã lưu của thành phố trong một truy vấn: (tên điểm đầu, tên điểm cuối, giây, mét)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT start_location, end_location, duration_seconds, distance_meters FROM travel_times "
+            "WHERE city_id = %s",
+            (city_id,)
+        )
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+    start_locations = [row[0] for row in rows]
+    end_locations = [row[1] for row in rows]
+    seconds = np.array([row[2] for row in rows], dtype=np.float32)
+    meters = np.array([np.nan if row[3] is None else row[3] for row in rows], dtype=np.float32)
+    return start_locations, end_locations, seconds, meters
+
+
+def load_travel_matrix(city_id: int, names: list) -> TravelMatrix:
+    """Ma trận thời gian di chuyển của thành phố theo thứ tự địa điểm names."""
+    start_locations, end_locations, seconds, meters = fetch_pairs(city_id)
+    matrix = TravelMatrix.from_pairs(names, start_locations, end_locations, seconds, meters)
+    logger.info("Loaded travel matrix", city_id=city_id, pairs=len(seconds), destinations=matrix.n,
+                mb=round(matrix.nbytes / 2**20, 2))
+    return matrix
+
+
+def save_pairs(path: str, city: str, start_locations: list, end_locations: list, seconds, meters):
+    """Ghi các cặp ra file .npz nén, mỗi tên địa điểm chỉ lưu một lần."""
+    names, inverse = np.unique(np.array(start_locations + end_locations, dtype=str), return_inverse=True)
+    inverse = inverse.astype(np.int32)
+    with open(path, "wb") as f:
+        np.savez_compressed(
+            f,
+            version=np.array(FILE_VERSION),
+            city=np.array(city),
+            names=names,
+            starts=inverse[:len(start_locations)],
+            ends=inverse[len(start_locations):],
+            seconds=np.asarray(seconds, dtype=np.float32),
+            meters=np.asarray(meters, dtype=np.float32),
+        )
+
+
+def load_pairs(path: str) -> dict:
+    """Đọc file do save_pairs ghi: {"city", "start_locations", "end_locations", "seconds", "meters"}."""
+    with np.load(path, allow_pickle=False) as data:
+        version = int(data["version"])
+        if version != FILE_VERSION:
+            raise ValueError(f"Unsupported travel matrix file version {version}")
+        names = data["names"]
+        return {
+            "city": str(data["city"]),
+            "start_locations": names[data["starts"]].tolist(),
+            "end_locations": names[data["ends"]].tolist(),
+            "seconds": data["seconds"],
+            "meters": data["meters"],
+        }
+
+
+def export_city(city: str, path: str) -> dict:
+    """Xuất mọi cặp đã lưu của thành phố ra file .npz."""
+    start_locations, end_locations, seconds, meters = fetch_pairs(get_city_id(city))
+    save_pairs(path, city, start_locations, end_locations, seconds, meters)
+    stats = {"city": city, "pairs": len(seconds), "bytes": os.path.getsize(path)}
+    logger.info("Exported travel matrix", path=path, **stats)
+    return stats
+
+
+def import_file(path: str, city: str = None, dry_run: bool = False) -> dict:
+    """Ghi các cặp trong file vào travel_times của city (mặc định thành phố lưu trong file).
+
+    Chỉ nhận cặp có cả hai địa điểm thuộc thành phố; cặp đã có được ghi đè bằng giá trị trong file.
+    """
+    pairs = load_pairs(path)
+    city = city or pairs["city"]
+    city_id = get_city_id(city)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    stats = {"city": city, "read": len(pairs["seconds"]), "written": 0, "unknown_destinations": 0}
+    try:
+        cursor.execute("SELECT name FROM destinations WHERE city_id = %s", (city_id,))
+        names = [row[0] for row in cursor.fetchall()]
+        starts = _index(names, pairs["start_locations"])
+        ends = _index(names, pairs["end_locations"])
+        known = np.flatnonzero((starts >= 0) & (ends >= 0) & ~np.isnan(pairs["seconds"]))
+        stats["unknown_destinations"] = stats["read"] - len(known)
+        for offset in range(0, len(known), IMPORT_BATCH):
+            batch = known[offset:offset + IMPORT_BATCH]
+            cursor.executemany(UPSERT_TRAVEL_TIME_SQL, [
+                (city_id, names[starts[i]], names[ends[i]], float(pairs["seconds"][i]),
+                 None if np.isnan(pairs["meters"][i]) else float(pairs["meters"][i]))
+                for i in batch
+            ])
+            if dry_run:
+                conn.rollback()
+            else:
+                conn.commit()
+            stats["written"] += len(batch)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    if stats["written"] and not dry_run:
+        invalidate_city(city_id)
+    logger.info("Imported travel matrix", path=path, dry_run=dry_run, **stats)
+    return stats
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="Xuất thời gian di chuyển của một thành phố ra file .npz")
+    export_parser.add_argument("city")
+    export_parser.add_argument("path")
+    import_parser = commands.add_parser("import", help="Nhập file .npz vào travel_times")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--city", default=None, help="Mặc định là thành phố lưu trong file")
+    import_parser.add_argument("--dry-run", action="store_true", help="Chỉ kiểm tra, rollback mọi transaction")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        stats = export_city(args.city, args.path)
+    else:
+        stats = import_file(args.path, args.city, args.dry_run)
+    print(json.dumps(stats, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+import os
+from itertools import permutations
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import structlog
+
+from app.metrics import stage_timer
+from app.utils import haversine_km
+
+logger = structlog.get_logger()
+
+# Số luồng lập kế hoạch song song cho các thành phố (phần lớn thời gian chờ MySQL/ORS/OpenWeatherMap)
+TRIP_PLANNER_WORKERS = int(os.getenv("TRIP_PLANNER_WORKERS", 4))
+# Ước lượng chặng liên thành phố từ khoảng cách đường chim bay giữa tâm hai thành phố
+TRIP_ROAD_FACTOR = float(os.getenv("TRIP_ROAD_FACTOR", 1.3))
+TRIP_AVERAGE_SPEED_KMH = float(os.getenv("TRIP_AVERAGE_SPEED_KMH", 50))
+# Tối đa số thành phố thử mọi thứ tự, vượt quá thì dùng láng giềng gần nhất
+TRIP_EXACT_ORDER_LIMIT = 8
+
+
+def split_days(cities: list, days) -> dict:
+    """Chia số ngày cho từng thành phố.
+
+    days là tổng số ngày (chia đều, phần dư cho các thành phố đầu) hoặc dict {city: số ngày}.
+    """
+    if isinstance(days, dict):
+        allocation = {city: int(days.get(city, 0)) for city in cities}
+    else:
+        days = int(days)
+        if days < len(cities):
+            raise ValueError(f"At least {len(cities)} days are required to visit {len(cities)} cities")
+        base, extra = divmod(days, len(cities))
+        allocation = {city: base + (1 if i < extra else 0) for i, city in enumerate(cities)}
+    if any(n < 1 for n in allocation.values()):
+        raise ValueError("Each city needs at least one day")
+    return allocation
+
+
+def city_centroid(recommender) -> tuple:
+    """Tâm (lat, lon) các địa điểm có tọa độ của thành phố, None nếu chưa có địa điểm nào được geocode."""
+    catalogue = recommender.catalogue
+    if catalogue is None or np.isnan(catalogue.latitude).all():
+        return None
+    return float(np.nanmean(catalogue.latitude)), float(np.nanmean(catalogue.longitude))
+
+
+def estimate_leg(origin: tuple, destination: tuple) -> dict:
+    """Ước lượng quãng đường và thời gian di chuyển giữa hai thành phố."""
+    if origin is None or destination is None:
+        return {"distance_km": "N/A", "duration_hours": "N/A"}
+    distance = float(haversine_km(origin[0], origin[1], destination[0], destination[1])) * TRIP_ROAD_FACTOR
+    return {
+        "distance_km": round(distance, 1),
+        "duration_hours": round(distance / TRIP_AVERAGE_SPEED_KMH, 2),
+    }
+
+
+def order_cities(cities: list, centroids: dict) -> list:
+    """Sắp xếp thành phố để tổng quãng đường liên thành phố ngắn nhất, giữ nguyên thành phố xuất phát.
+
+    Thành phố chưa có tọa độ được đặt cuối theo thứ tự yêu cầu.
+    """
+    start, rest = cities[0], cities[1:]
+    located = [city for city in rest if centroids.get(city)]
+    unlocated = [city for city in rest if not centroids.get(city)]
+    if centroids.get(start) is None or len(located) < 2:
+        return [start] + located + unlocated
+
+    points = {city: centroids[city] for city in [start] + located}
+    names = list(points)
+    lat = np.array([points[city][0] for city in names])
+    lon = np.array([points[city][1] for city in names])
+    distances = haversine_km(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+    index = {city: i for i, city in enumerate(names)}
+
+    if len(located) < TRIP_EXACT_ORDER_LIMIT:
+        def length(order):
+            path = [0] + [index[city] for city in order]
+            return distances[path[:-1], path[1:]].sum()
+        best = list(min(permutations(located), key=length))
+    else:
+        best, current, remaining = [], start, set(located)
+        while remaining:
+            current = min(remaining, key=lambda city: distances[index[current], index[city]])
+            best.append(current)
+            remaining.remove(current)
+    return [start] + best + unlocated
+
+
+def split_route(route: list, n_days: int) -> list:
+    """Chia lộ trình trong thành phố thành n_days ngày liền nhau, số điểm mỗi ngày chênh nhau tối đa 1."""
+    base, extra = divmod(len(route), n_days)
+    days, start = [], 0
+    for day in range(n_days):
+        stop = start + base + (1 if day < extra else 0)
+        days.append(route[start:stop])
+        start = stop
+    return days
+
+
+class TripPlanner:
+    """Lập lịch trình nhiều thành phố theo hai cấp.
+
+    Cấp thành phố: chia ngày, ngân sách và chọn thứ tự thành phố. Cấp địa điểm: mỗi thành phố dùng
+    Q-table riêng của nó (TravelRecommender.recommend_route), chạy song song trên thread pool.
+    """
+
+    def __init__(self, recommender_factory, workers: int = TRIP_PLANNER_WORKERS):
+        self.recommender_factory = recommender_factory
+        self.workers = workers
+
+    def plan_city(self, city: str, n_days: int, stops_per_day: int, user_prefs: dict) -> dict:
+        """Lộ trình trong một thành phố, đã chia theo ngày."""
+        try:
+            recommender = self.recommender_factory(city)
+            route = recommender.recommend_route(user_prefs, n_days * stops_per_day)
+        except Exception as e:
+            logger.error("City planning failed", city=city, error=str(e))
+            return {"city": city, "error": str(e)}
+        return {
+            "city": city,
+            "centroid": city_centroid(recommender),
+            "days": split_route(route, n_days),
+            "ticket_price": sum(stop.get("ticket_price") or 0 for stop in route),
+        }
+
+    @stage_timer("trip_planning")
+    def plan(self, cities: list, days, stops_per_day: int = 3, user_prefs: dict = None,
+             keep_order: bool = False) -> dict:
+        cities = list(dict.fromkeys(cities))
+        if not cities:
+            raise ValueError("At least one city is required")
+        user_prefs = user_prefs or {}
+        allocation = split_days(cities, days)
+        total_days = sum(allocation.values())
+
+        # Ngân sách vé chia theo tỷ lệ số ngày ở mỗi thành phố
+        max_budget = user_prefs.get("max_budget", float("inf"))
+        city_prefs = {
+            city: {**user_prefs, "max_budget": max_budget * allocation[city] / total_days}
+            for city in cities
+        }
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(cities)))) as pool:
+            futures = {
+                city: pool.submit(self.plan_city, city, allocation[city], stops_per_day, city_prefs[city])
+                for city in cities
+            }
+            plans = {city: future.result() for city, future in futures.items()}
+
+        failed = [plan for plan in plans.values() if "error" in plan]
+        if len(failed) == len(cities):
+            raise ValueError("; ".join(f"{plan['city']}: {plan['error']}" for plan in failed))
+
+        planned = [city for city in cities if "error" not in plans[city]]
+        centroids = {city: plans[city]["centroid"] for city in planned}
+        order = planned if keep_order else order_cities(planned, centroids)
+
+        itinerary, legs, day_number = [], [], 1
+        for i, city in enumerate(order):
+            if i:
+                legs.append({
+                    "from": order[i - 1],
+                    "to": city,
+                    "after_day": day_number - 1,
+                    **estimate_leg(centroids[order[i - 1]], centroids[city]),
+                })
+            city_days = []
+            for stops in plans[city]["days"]:
+                city_days.append({"day": day_number, "stops": stops})
+                day_number += 1
+            itinerary.append({"city": city, "days": city_days})
+
+        logger.info("Trip planned", cities=order, days=total_days, failed=[plan["city"] for plan in failed])
+        return {
+            "itinerary": itinerary,
+            "legs": legs,
+            "total_ticket_price": sum(plans[city]["ticket_price"] for city in order),
+            "errors": [{"city": plan["city"], "error": plan["error"]} for plan in failed],
+        }
@@ -0,0 +1,35 @@
+import time
+import threading
+import numpy as np
+
+# Bán kính Trái Đất (km) cho khoảng cách haversine
+EARTH_RADIUS_KM = 6371.0
+
+_log_counters = {}
+_log_last = {}
+_log_lock = threading.Lock()
+
+
+def log_every_n(key: str, n: int) -> bool:
+    """Trả về True cho lần gọi thứ 1, n+1, 2n+1... của key (lấy mẫu log trong vòng lặp nóng)."""
+    with _log_lock:
+        count = _log_counters.get(key, 0)
+        _log_counters[key] = count + 1
+    return count % n == 0
+
+
+def log_every_seconds(key: str, interval: float) -> bool:
+    """Trả về True nếu đã qua ít nhất interval giây kể từ lần log trước của key."""
+    now = time.monotonic()
+    with _log_lock:
+        if now - _log_last.get(key, float("-inf")) < interval:
+            return False
+        _log_last[key] = now
+    return True
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Khoảng cách haversine (km), nhận số hoặc mảng NumPy."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(h))
@@ -0,0 +1,150 @@
+"""Server giả lập ORS (directions, matrix, geocode) và OpenWeatherMap cho benchmark.
+
+    python -m benchmarks.fake_services --port 8090 --latency-ms 80 --jitter-ms 40 --rate-429 0.02
+
+Trỏ ứng dụng vào server bằng ORS_BASE_URL=http://localhost:8090 và WEATHER_BASE_URL=http://localhost:8090.
+"""
+import sys
+import json
+import math
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from benchmarks.synthetic import CENTER
+
+# Tốc độ trung bình trong thành phố (m/s), dùng để quy đổi quãng đường ra thời gian
+AVERAGE_SPEED = 8.0
+
+
+def haversine_m(a: list, b: list) -> float:
+    """Khoảng cách giữa hai điểm [lon, lat] theo mét."""
+    lon1, lat1, lon2, lat2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371000 * math.asin(math.sqrt(h))
+
+
+class FakeServiceConfig:
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, rate_429: float = 0.0,
+                 retry_after: int = 1, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counters = {}
+
+    def count(self, key: str):
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+
+class FakeServiceHandler(BaseHTTPRequestHandler):
+    config = FakeServiceConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _delay_or_throttle(self, endpoint: str) -> bool:
+        config = self.config
+        with config.lock:
+            delay = max(0.0, config.latency_ms + config.rng.uniform(-config.jitter_ms, config.jitter_ms))
+            throttled = config.rng.random() < config.rate_429
+        time.sleep(delay / 1000)
+        config.count(endpoint)
+        if throttled:
+            config.count(f"{endpoint}:429")
+            self._send(429, {"error": "Rate limit exceeded"}, {"Retry-After": str(config.retry_after)})
+        return throttled
+
+    def _send(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json_body(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        if parsed.path == "/geocode/autocomplete":
+            if self._delay_or_throttle("geocode"):
+                return
+            digest = hashlib.sha1(query.get("text", [""])[0].encode("utf-8")).digest()
+            lat = CENTER[0] + (digest[0] / 255 - 0.5) * 0.3
+            lon = CENTER[1] + (digest[1] / 255 - 0.5) * 0.3
+            return self._send(200, {"features": [{"geometry": {"coordinates": [lon, lat]}}]})
+        if parsed.path == "/data/2.5/weather":
+            if self._delay_or_throttle("weather"):
+                return
+            return self._send(200, {"weather": [{"description": "clear sky"}], "main": {"temp": 22.5}})
+        if parsed.path == "/stats":
+            return self._send(200, dict(self.config.counters))
+        self._send(404, {"error": "Not found"})
+
+    def do_POST(self):
+        parsed = urlparse(self.path)
+        if parsed.path.startswith("/v2/directions/"):
+            if self._delay_or_throttle("directions"):
+                return
+            coordinates = self._json_body().get("coordinates", [])
+            distance = sum(haversine_m(a, b) for a, b in zip(coordinates, coordinates[1:]))
+            duration = distance / AVERAGE_SPEED
+            summary = {"distance": distance, "duration": duration}
+            step = {"instruction": "Continue", "distance": distance, "duration": duration}
+            return self._send(200, {"features": [{
+                "geometry": {"coordinates": coordinates},
+                "properties": {"summary": summary, "segments": [{"steps": [step]}]},
+            }]})
+        if parsed.path.startswith("/v2/matrix/"):
+            if self._delay_or_throttle("matrix"):
+                return
+            locations = self._json_body().get("locations", [])
+            durations = [[haversine_m(a, b) / AVERAGE_SPEED for b in locations] for a in locations]
+            distances = [[haversine_m(a, b) for b in locations] for a in locations]
+            return self._send(200, {"durations": durations, "distances": distances})
+        self._send(404, {"error": "Not found"})
+
+
+def start_server(port: int = 0, config: FakeServiceConfig = None) -> ThreadingHTTPServer:
+    """Chạy server ở luồng nền và trả về đối tượng server (port thực tế ở server.server_port)."""
+    handler = type("ConfiguredHandler", (FakeServiceHandler,), {"config": config or FakeServiceConfig()})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, name="fake-services", daemon=True).start()
+    return server
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Tỷ lệ request bị trả 429 (0-1)")
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    config = FakeServiceConfig(args.latency_ms, args.jitter_ms, args.rate_429, args.retry_after)
+    server = start_server(args.port, config)
+    print(f"Fake ORS/weather listening on http://127.0.0.1:{server.server_port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""Load test các endpoint /recommend, /train, /submit_review với ORS/weather giả lập.
+
+    python -m benchmarks.seed --reset
+    python -m benchmarks.load_test --city "Bench 100" --concurrency 8 --duration 30
+
+Script khởi động server giả lập và uvicorn (trỏ vào database benchmark), chờ /ready rồi gửi tải
+song song. Kết quả: throughput, latency p50/p99, tỷ lệ lỗi theo endpoint và RSS tối đa của server.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.fake_services import FakeServiceConfig, start_server
+from benchmarks.seed import BENCH_DB_NAME
+from benchmarks.synthetic import REVIEWS, TYPES
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def process_rss_mb(pid: int) -> float:
+    """RSS của tiến trình và các tiến trình con (uvicorn --workers)."""
+    total = 0.0
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids += [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) / 1024
+        except OSError:
+            continue
+    return total
+
+
+def start_app(port: int, fake_url: str, workers: int, ors_per_min: int, extra_env: dict) -> subprocess.Popen:
+    env = os.environ.copy()
+    env.update({
+        "DB_NAME": BENCH_DB_NAME,
+        "DB_HOST": os.getenv("DB_HOST", "127.0.0.1"),
+        "ORS_BASE_URL": fake_url,
+        "WEATHER_BASE_URL": fake_url,
+        "ORS_API_KEY": "bench",
+        "WEATHER_API_KEY": "bench",
+        "ORS_RATE_LIMIT_DIR": f"/tmp/ors_rate_limit_bench_{port}",
+        "ORS_RATE_DIRECTIONS_PER_MIN": str(ors_per_min),
+        "ORS_RATE_MATRIX_PER_MIN": str(ors_per_min),
+        "ORS_RATE_GEOCODE_PER_MIN": str(ors_per_min),
+    })
+    env.update(extra_env)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_ready(base_url: str, timeout: float) -> float:
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            if requests.get(f"{base_url}/ready", timeout=2).status_code == 200:
+                return time.perf_counter() - started
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"App not ready after {timeout}s")
+
+
+def make_request(base_url: str, endpoint: str, city: str, destinations: list, rng: random.Random):
+    if endpoint == "recommend":
+        params = {"city": city, "steps": 3}
+        if rng.random() < 0.5:
+            params["preferred_type"] = rng.choice(TYPES)
+        return requests.get(f"{base_url}/recommend", params=params, timeout=120)
+    if endpoint == "train":
+        return requests.post(f"{base_url}/train", json={"city": city, "episodes": 5}, timeout=300)
+    if endpoint == "submit_review":
+        return requests.post(f"{base_url}/submit_review", json={
+            "city": city,
+            "destination_name": rng.choice(destinations),
+            "review_text": rng.choice(REVIEWS),
+        }, timeout=120)
+    raise ValueError(f"Unknown endpoint {endpoint}")
+
+
+def run_load(base_url: str, mix: dict, city: str, destinations: list, concurrency: int,
+             duration: float, app_pid: int) -> dict:
+    latencies = {endpoint: [] for endpoint in mix}
+    errors = {endpoint: 0 for endpoint in mix}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    peak_rss = [0.0]
+    endpoints = [endpoint for endpoint, weight in mix.items() for _ in range(weight)]
+
+    def worker(seed: int):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            endpoint = rng.choice(endpoints)
+            started = time.perf_counter()
+            try:
+                ok = make_request(base_url, endpoint, city, destinations, rng).status_code < 500
+            except requests.exceptions.RequestException:
+                ok = False
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies[endpoint].append(elapsed)
+                errors[endpoint] += 0 if ok else 1
+
+    def sample_rss():
+        while time.perf_counter() < deadline:
+            peak_rss[0] = max(peak_rss[0], process_rss_mb(app_pid))
+            time.sleep(0.5)
+
+    threading.Thread(target=sample_rss, daemon=True).start()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+
+    report = {}
+    for endpoint, values in latencies.items():
+        if not values:
+            continue
+        report[endpoint] = {
+            "requests": len(values),
+            "errors": errors[endpoint],
+            "throughput_per_s": round(len(values) / duration, 2),
+            "latency_p50_ms": round(statistics.median(values), 1),
+            "latency_p99_ms": round(percentile(values, 0.99), 1),
+        }
+    report["server_peak_rss_mb"] = round(peak_rss[0], 1)
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--city", default="Bench 100")
+    parser.add_argument("--mix", default="recommend=8,submit_review=2,train=0",
+                        help="Tỷ trọng endpoint, ví dụ recommend=8,submit_review=2,train=1")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Độ trễ của ORS/weather giả lập")
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--ors-per-min", type=int, default=6000, help="Hạn mức token bucket ORS của ứng dụng")
+    parser.add_argument("--ready-timeout", type=float, default=300)
+    args = parser.parse_args(argv)
+
+    mix = {}
+    for item in args.mix.split(","):
+        endpoint, weight = item.split("=")
+        if int(weight) > 0:
+            mix[endpoint] = int(weight)
+
+    fake = start_server(0, FakeServiceConfig(args.latency_ms, args.jitter_ms, args.rate_429))
+    fake_url = f"http://127.0.0.1:{fake.server_port}"
+    # Chỉ nạp mô hình cảm xúc khi có tải /submit_review
+    extra_env = {"WARMUP_SENTIMENT_MODEL": "1" if "submit_review" in mix else "0"}
+    app = start_app(args.port, fake_url, args.workers, args.ors_per_min, extra_env)
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        ready_seconds = wait_ready(base_url, args.ready_timeout)
+        response = requests.get(f"{base_url}/recommend", params={"city": args.city, "steps": 50}, timeout=120)
+        destinations = [step["destination"] for step in response.json()] if response.ok else []
+        report = run_load(base_url, mix, args.city, destinations, args.concurrency, args.duration, app.pid)
+        report["ready_seconds"] = round(ready_seconds, 2)
+        report["fake_service_calls"] = dict(fake.RequestHandlerClass.config.counters)
+        print(json.dumps(report, indent=2))
+    finally:
+        app.terminate()
+        app.wait(timeout=30)
+        fake.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
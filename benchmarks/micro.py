@@ -0,0 +1,127 @@
+"""Micro-benchmark cho TravelRecommender.train, recommend_route, calculate_reward và RewardEngine.
+
+    python -m benchmarks.micro --sizes 10 100 500 2000
+
+Database, thời tiết và thời gian di chuyển được thay bằng dữ liệu trong bộ nhớ để chỉ đo phần tính toán.
+"""
+import sys
+import json
+import time
+import argparse
+import statistics
+
+import numpy as np
+
+import app.routes as routes
+from app.routes import TravelRecommender
+from app.catalogue import DestinationCatalogue
+from app.sparse_qtable import TopKQTable
+from app.rewards import RewardEngine
+from benchmarks.fake_services import haversine_m, AVERAGE_SPEED
+from benchmarks.synthetic import make_destinations
+
+WEATHER = {"description": "clear sky", "temperature": 22.5}
+
+
+def make_recommender(n: int, seed: int = 0, q_format: str = "dense", top_k: int = 32) -> TravelRecommender:
+    """Tạo recommender với n địa điểm giả lập và Q-table ngẫu nhiên, bỏ qua database."""
+    recommender = TravelRecommender.__new__(TravelRecommender)
+    recommender.city = f"Bench {n}"
+    recommender.city_id = 0
+    recommender.snapshot = None
+    recommender.destinations = make_destinations(n, seed)
+    recommender.n_states = n
+    recommender.catalogue = DestinationCatalogue(recommender.destinations)
+    rng = np.random.default_rng(seed)
+    if q_format == TopKQTable.FORMAT:
+        catalogue = recommender.catalogue
+        recommender.q_table = TopKQTable.nearest(catalogue.latitude, catalogue.longitude, top_k)
+        recommender.q_table.values[:] = rng.random(recommender.q_table.values.shape)
+    else:
+        recommender.q_table = rng.random((n, n))
+    recommender.load_q_table = lambda: None
+    recommender.save_q_table = lambda: None
+    return recommender
+
+
+def install_offline_services(destinations: list):
+    """Thay get_current_weather/get_travel_time trong app.routes bằng bản tra cứu trong bộ nhớ."""
+    coords = {d["name"]: [d["longitude"], d["latitude"]] for d in destinations}
+
+    def get_travel_time(start_location, end_location, city, priority=None):
+        meters = haversine_m(coords[start_location], coords[end_location])
+        return {"duration_seconds": meters / AVERAGE_SPEED, "distance_meters": meters}
+
+    routes.get_current_weather = lambda city: dict(WEATHER)
+    routes.get_travel_time = get_travel_time
+
+
+def measure(fn, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "mean_ms": round(statistics.mean(timings), 3),
+        "p50_ms": round(timings[len(timings) // 2], 3),
+        "p99_ms": round(timings[min(len(timings) - 1, int(0.99 * len(timings)))], 3),
+    }
+
+
+def q_table_footprint(q_table) -> dict:
+    """Bộ nhớ và thời gian parse JSON (như khi nạp từ bảng q_tables) của Q-table."""
+    if isinstance(q_table, TopKQTable):
+        payload = json.dumps(q_table.to_dict())
+        load = lambda: TopKQTable.from_dict(json.loads(payload))
+    else:
+        payload = json.dumps(np.round(q_table, 6).tolist())
+        load = lambda: np.array(json.loads(payload), dtype=np.float64)
+    return {
+        "memory_mb": round(q_table.nbytes / 2**20, 2),
+        "json_mb": round(len(payload) / 2**20, 2),
+        "json_load": measure(load, 3),
+    }
+
+
+def run(sizes: list, episodes: int, steps: int, repeat: int, q_format: str = "dense", top_k: int = 32) -> list:
+    results = []
+    for n in sizes:
+        recommender = make_recommender(n, q_format=q_format, top_k=top_k)
+        install_offline_services(recommender.destinations)
+        user_prefs = {"preferred_type": "nature", "max_budget": 100000}
+        travel_time = {"duration_seconds": 740.4, "distance_meters": 9870.0}
+        destination = recommender.destinations[0]
+        engine = RewardEngine(recommender.catalogue)
+        travel_minutes = np.random.default_rng(0).uniform(5, 60, (n, n)).astype(np.float32)
+
+        results.append({
+            "destinations": n,
+            "q_format": q_format,
+            "q_table": q_table_footprint(recommender.q_table),
+            "calculate_reward": measure(
+                lambda: recommender.calculate_reward(WEATHER, travel_time, destination, user_prefs), repeat * 100
+            ),
+            "reward_matrix": measure(lambda: engine.reward_matrix(WEATHER, travel_minutes, user_prefs), repeat),
+            "recommend_route": measure(lambda: recommender.recommend_route(user_prefs, steps), repeat),
+            f"train_{episodes}_episodes": measure(lambda: recommender.train(episodes, user_prefs), max(1, repeat // 10)),
+        })
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500, 2000])
+    parser.add_argument("--episodes", type=int, default=50)
+    parser.add_argument("--steps", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--q-format", choices=["dense", TopKQTable.FORMAT], default="dense")
+    parser.add_argument("--top-k", type=int, default=32)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.sizes, args.episodes, args.steps, args.repeat, args.q_format, args.top_k), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""Tạo database MySQL cho benchmark từ schema trong init.sql/migrations và dữ liệu giả lập.
+
+    DB_HOST=127.0.0.1 DB_PASSWORD=... python -m benchmarks.seed --sizes 10 100 500 2000 --reset
+
+Ngoài các thành phố trong app/data/destinations.json, mỗi kích thước tạo một thành phố "Bench <n>"
+với n địa điểm, vài bình luận và một Q-table ngẫu nhiên để /recommend chạy được ngay.
+"""
+import os
+import re
+import sys
+import glob
+import json
+import argparse
+
+import mysql.connector
+import numpy as np
+
+from benchmarks.synthetic import load_seed_destinations, make_destinations, make_reviews
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DB_NAME = os.getenv("BENCH_DB_NAME", "travel_recommendation_bench")
+
+
+def schema_statements() -> list:
+    """Lấy các câu CREATE TABLE từ init.sql và các file migrations (bỏ qua dữ liệu mẫu)."""
+    statements = []
+    for path in [os.path.join(ROOT, "init.sql")] + sorted(glob.glob(os.path.join(ROOT, "migrations", "*.sql"))):
+        with open(path, encoding="utf-8") as f:
+            lines = [line for line in f if not line.strip().startswith("--")]
+        for statement in "".join(lines).split(";"):
+            statement = statement.strip()
+            if statement.upper().startswith("CREATE TABLE"):
+                statements.append(re.sub(r"^CREATE TABLE (IF NOT EXISTS )?", "CREATE TABLE IF NOT EXISTS ", statement))
+    return statements
+
+
+def connect(database: str = None):
+    return mysql.connector.connect(
+        host=os.getenv("DB_HOST", "127.0.0.1"),
+        user=os.getenv("DB_USER", "root"),
+        password=os.getenv("DB_PASSWORD"),
+        database=database,
+    )
+
+
+def insert_city(cursor, name: str, destinations: list, reviews_per_destination: int, seed: int) -> int:
+    cursor.execute("INSERT INTO cities (name, country) VALUES (%s, 'Vietnam')", (name,))
+    city_id = cursor.lastrowid
+    cursor.executemany(
+        "INSERT INTO destinations (name, city_id, type, opening_hours, ticket_price, popularity, "
+        "latitude, longitude, sentiment_score) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+        [
+            (d["name"], city_id, d["type"], d["opening_hours"], d["ticket_price"], d["popularity"],
+             d["latitude"], d["longitude"], d.get("sentiment_score", 0.0))
+            for d in destinations
+        ]
+    )
+    cursor.execute("SELECT id FROM destinations WHERE city_id = %s ORDER BY id", (city_id,))
+    destination_ids = [row[0] for row in cursor.fetchall()]
+
+    texts = make_reviews(len(destination_ids) * reviews_per_destination, seed)
+    cursor.executemany(
+        "INSERT INTO reviews (destination_id, review_text, sentiment_score) VALUES (%s, %s, NULL)",
+        [(destination_ids[i % len(destination_ids)], text) for i, text in enumerate(texts)]
+    )
+
+    rng = np.random.default_rng(seed)
+    n = len(destination_ids)
+    q_table = np.round(rng.random((n, n)), 3)
+    cursor.execute(
+        "INSERT INTO q_tables (city_id, q_table) VALUES (%s, %s)",
+        (city_id, json.dumps(q_table.tolist()))
+    )
+    return city_id
+
+
+def seed(sizes: list, reviews_per_destination: int = 2, reset: bool = False):
+    conn = connect()
+    cursor = conn.cursor()
+    if reset:
+        cursor.execute(f"DROP DATABASE IF EXISTS `{BENCH_DB_NAME}`")
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{BENCH_DB_NAME}`")
+    cursor.execute(f"USE `{BENCH_DB_NAME}`")
+    for statement in schema_statements():
+        cursor.execute(statement)
+
+    by_city = {}
+    for dest in load_seed_destinations():
+        by_city.setdefault(dest["city"], []).append({
+            **dest,
+            "latitude": dest["coordinates"]["lat"],
+            "longitude": dest["coordinates"]["lon"],
+        })
+    cities = list(by_city.items()) + [(f"Bench {n}", make_destinations(n, seed=n)) for n in sizes]
+
+    for i, (name, destinations) in enumerate(cities):
+        city_id = insert_city(cursor, name, destinations, reviews_per_destination, seed=i)
+        conn.commit()
+        print(f"Seeded {name} (city_id={city_id}, destinations={len(destinations)})")
+    cursor.close()
+    conn.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500, 2000])
+    parser.add_argument("--reviews-per-destination", type=int, default=2)
+    parser.add_argument("--reset", action="store_true", help="Xóa database benchmark cũ trước khi tạo")
+    args = parser.parse_args(argv)
+    seed(args.sizes, args.reviews_per_destination, args.reset)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""So sánh latency, throughput và RSS của các backend cảm xúc.
+
+    python -m benchmarks.sentiment_backends --backends torch quantized onnx
+
+Mỗi backend chạy trong một tiến trình riêng để số liệu RSS không bị lẫn giữa các mô hình.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import statistics
+
+from app.model_loader import RECOMMENDER_SENTIMENT_MODEL
+from app.sentiment_export import SAMPLE_REVIEWS
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def run_backend(name: str, model: str, iterations: int, batch_size: int) -> dict:
+    from app.sentiment_backends import create_backend
+
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    # Tắt cache để đo đúng chi phí tokenize và suy luận
+    backend = create_backend(name, model, result_cache_size=0, token_cache_size=0)
+    load_seconds = time.perf_counter() - started
+    backend.labels(SAMPLE_REVIEWS[:1])  # warm-up
+
+    latencies = []
+    for i in range(iterations):
+        text = SAMPLE_REVIEWS[i % len(SAMPLE_REVIEWS)]
+        started = time.perf_counter()
+        backend.labels([text])
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    batch = [SAMPLE_REVIEWS[i % len(SAMPLE_REVIEWS)] for i in range(batch_size)]
+    started = time.perf_counter()
+    rounds = max(1, iterations // batch_size)
+    for _ in range(rounds):
+        backend.labels(batch)
+    throughput = rounds * batch_size / (time.perf_counter() - started)
+
+    return {
+        "backend": name,
+        "load_seconds": round(load_seconds, 2),
+        "latency_p50_ms": round(statistics.median(latencies), 2),
+        "latency_p99_ms": round(percentile(latencies, 0.99), 2),
+        "throughput_per_s": round(throughput, 1),
+        "rss_mb": round(rss_mb(), 1),
+        "rss_model_mb": round(rss_mb() - rss_before, 1),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch", "quantized", "onnx"])
+    parser.add_argument("--model", default=RECOMMENDER_SENTIMENT_MODEL)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.single:
+        print(json.dumps(run_backend(args.backends[0], args.model, args.iterations, args.batch_size)))
+        return 0
+
+    results = []
+    for name in args.backends:
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.sentiment_backends", "--single", "--backends", name,
+             "--model", args.model, "--iterations", str(args.iterations), "--batch-size", str(args.batch_size)],
+            capture_output=True, text=True, env=os.environ.copy()
+        )
+        if proc.returncode != 0:
+            results.append({"backend": name, "error": proc.stderr.strip().splitlines()[-1:]})
+            continue
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
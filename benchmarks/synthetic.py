@@ -0,0 +1,47 @@
+"""Sinh dữ liệu giả lập (thành phố, địa điểm, bình luận) cho benchmark."""
+import json
+import os
+import random
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "app", "data", "destinations.json")
+TYPES = ["sightseeing", "cultural", "nature", "market"]
+PRICES = [0, 0, 5000, 30000, 40000, 50000, 100000]
+REVIEWS = [
+    "Hồ rất đẹp",
+    "Hồ đẹp nhưng nhiều người quá",
+    "Tệ lắm, người dân không thân thiện",
+    "Cảnh quan tuyệt vời, sẽ quay lại!",
+    "Giá vé hơi cao so với trải nghiệm.",
+]
+# Tâm thành phố Đà Lạt, các địa điểm giả lập rải trong bán kính ~15km
+CENTER = (11.9404, 108.4583)
+
+
+def load_seed_destinations() -> list:
+    with open(DATA_FILE, encoding="utf-8") as f:
+        return json.load(f)["destinations"]
+
+
+def make_destinations(n: int, seed: int = 0) -> list:
+    """Sinh n địa điểm với loại, giá vé, độ phổ biến và tọa độ ngẫu nhiên (cố định theo seed)."""
+    rng = random.Random(seed)
+    return [
+        {
+            "id": i + 1,
+            "name": f"POI {i:05d}",
+            "type": rng.choice(TYPES),
+            "opening_hours": "07:00-17:00",
+            "ticket_price": rng.choice(PRICES),
+            "popularity": rng.randint(1, 10),
+            "sentiment_score": round(rng.uniform(-1, 1), 2),
+            "latitude": CENTER[0] + rng.uniform(-0.15, 0.15),
+            "longitude": CENTER[1] + rng.uniform(-0.15, 0.15),
+            "images": [],
+        }
+        for i in range(n)
+    ]
+
+
+def make_reviews(n: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [rng.choice(REVIEWS) for _ in range(n)]
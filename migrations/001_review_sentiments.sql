@@ -0,0 +1,11 @@
+-- Kết quả phân tích cảm xúc theo từng bình luận, kèm hash nội dung và phiên bản mô hình
+CREATE TABLE IF NOT EXISTS review_sentiments (
+    review_id INT NOT NULL PRIMARY KEY,
+    destination_id INT NOT NULL,
+    content_hash CHAR(40) NOT NULL,
+    model_version VARCHAR(100) NOT NULL,
+    score FLOAT NOT NULL,
+    scored_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_destination (destination_id),
+    INDEX idx_model_version (model_version, review_id)
+);
@@ -0,0 +1,28 @@
+-- Gộp các địa điểm trùng (city_id, name) về bản ghi có id nhỏ nhất rồi thêm khóa duy nhất cho việc nhập hàng loạt
+CREATE TEMPORARY TABLE duplicate_destinations AS
+SELECT d.id AS duplicate_id, k.keep_id, d.city_id
+FROM destinations d
+JOIN (
+    SELECT city_id, name, MIN(id) AS keep_id FROM destinations GROUP BY city_id, name HAVING COUNT(*) > 1
+) k ON k.city_id = d.city_id AND k.name = d.name
+WHERE d.id <> k.keep_id;
+
+UPDATE destination_images i JOIN duplicate_destinations dd ON dd.duplicate_id = i.destination_id
+SET i.destination_id = dd.keep_id;
+
+UPDATE reviews r JOIN duplicate_destinations dd ON dd.duplicate_id = r.destination_id
+SET r.destination_id = dd.keep_id;
+
+UPDATE review_sentiments rs JOIN duplicate_destinations dd ON dd.duplicate_id = rs.destination_id
+SET rs.destination_id = dd.keep_id;
+
+-- Q-table của các thành phố này đánh chỉ số theo danh sách địa điểm cũ, cần huấn luyện lại
+DELETE FROM q_tables WHERE city_id IN (SELECT DISTINCT city_id FROM duplicate_destinations);
+
+DELETE d FROM destinations d JOIN duplicate_destinations dd ON dd.duplicate_id = d.id;
+
+DROP TEMPORARY TABLE duplicate_destinations;
+
+ALTER TABLE destinations
+    ADD UNIQUE KEY unique_city_name (city_id, name),
+    DROP INDEX idx_city_name;
@@ -0,0 +1,5 @@
+-- Mã bình luận trả về cho client khi /submit_review nhận bình luận vào hàng đợi ghi sau,
+-- khóa duy nhất giúp ghi lại từ file spill không tạo bản ghi trùng
+ALTER TABLE reviews
+    ADD COLUMN submission_id CHAR(32) NULL,
+    ADD UNIQUE KEY unique_submission (submission_id);
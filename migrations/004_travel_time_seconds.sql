@@ -0,0 +1,24 @@
+-- Thời gian di chuyển lưu dạng số (giây, mét) thay cho chuỗi "12.34 mins" để nạp cả thành phố thành ma trận,
+-- khóa duy nhất theo cặp địa điểm để ON DUPLICATE KEY UPDATE ghi đè thay vì thêm bản ghi trùng
+ALTER TABLE travel_times
+    ADD COLUMN duration_seconds FLOAT NULL AFTER end_location,
+    ADD COLUMN distance_meters FLOAT NULL AFTER duration_seconds;
+
+UPDATE travel_times
+SET duration_seconds = CAST(SUBSTRING_INDEX(TRIM(duration), ' ', 1) AS DECIMAL(12, 2)) * 60
+WHERE TRIM(duration) REGEXP '^[0-9]+(\\.[0-9]+)? mins$';
+
+-- Bản ghi không đọc được thời gian sẽ được lấy lại từ ORS khi cần
+DELETE FROM travel_times WHERE duration_seconds IS NULL;
+
+-- Giữ bản ghi mới nhất của mỗi cặp
+DELETE t FROM travel_times t
+JOIN travel_times newer
+    ON newer.city_id = t.city_id AND newer.start_location = t.start_location
+    AND newer.end_location = t.end_location AND newer.id > t.id;
+
+ALTER TABLE travel_times
+    DROP COLUMN duration,
+    MODIFY duration_seconds FLOAT NOT NULL,
+    ADD UNIQUE KEY unique_city_pair (city_id, start_location, end_location),
+    DROP INDEX idx_city_locations;
@@ -0,0 +1,50 @@
+import io
+import json
+
+import pytest
+
+from app import ingest
+
+
+def parse(text: str) -> list:
+    return list(ingest._iter_json_array(io.StringIO(text)))
+
+
+@pytest.fixture(params=[1, 2, 3, 7])
+def read_size(request, monkeypatch):
+    # Buffer rất nhỏ để mọi giá trị đều có lúc bị cắt ở ranh giới đọc
+    monkeypatch.setattr(ingest, "READ_SIZE", request.param)
+    return request.param
+
+
+@pytest.mark.parametrize("text", [
+    "[1.5]",
+    "[]",
+    "  [ ]  ",
+    '[1e5, -2.5E-3, 10, true, false, null, "a]b,[", {"x": [1, 2]}, [[]]]',
+    '[{"name": "Hồ Xuân Hương", "images": ["a.jpg", "b.jpg"]}]',
+])
+def test_array_matches_json_load(read_size, text):
+    assert parse(text) == json.loads(text)
+
+
+def test_records_inside_object(read_size):
+    text = '{"meta": {"count": 2, "tags": ["x"]}, "destinations": [{"name": "a"}, {"name": "b"}], "after": 1}'
+    assert parse(text) == [{"name": "a"}, {"name": "b"}]
+
+
+@pytest.mark.parametrize("text", [
+    "[1,]",
+    "[1 2]",
+    "[,1]",
+    "[1,,2]",
+    "[1, 2",
+    "[1.]",
+    "[1, 2] x",
+    '{"a": 1 "b": [1]}',
+    '{"a": 1}',
+    '"not an array"',
+])
+def test_malformed_json_rejected(read_size, text):
+    with pytest.raises(ValueError):
+        parse(text)